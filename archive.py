@@ -0,0 +1,144 @@
+"""
+Локальный архив новостей (.state/archive.sqlite): всё, что видел сборщик бота.
+
+Сборщик main.py пишет каждого кандидата — заголовок, анонс, ссылку, источник,
+время публикации и первого появления, оценку — одной транзакцией на проход.
+Повтор той же ссылки только обновляет оценку (берётся максимальная).
+Сюжеты склеиваются теми же LSH-полосами, что и в пуле (clusters.band_keys):
+полоса → сюжет хранится в таблице bands, поэтому новость, пришедшая через
+неделю под другой ссылкой, попадает в тот же сюжет.
+
+Чтение — для крон-скриптов: top() — лучшие сюжеты за период по оценке (с
+числом источников), search() — полнотекстовый поиск (FTS5, если SQLite собран
+с ним). Записи старше RETENTION_DAYS удаляются при prune().
+"""
+import os, time, sqlite3, logging, threading
+from typing import Iterable, List, Optional
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+ARCHIVE_PATH = os.path.join(BASE, ".state", "archive.sqlite")
+RETENTION_DAYS = int(os.getenv("ARCHIVE_DAYS", "30"))
+PRUNE_EVERY = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY, link TEXT UNIQUE NOT NULL, title TEXT NOT NULL, summary TEXT,
+    source TEXT, image TEXT, published REAL, seen REAL NOT NULL, updated REAL NOT NULL,
+    score REAL NOT NULL DEFAULT 0, story INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS items_seen ON items(seen);
+CREATE INDEX IF NOT EXISTS items_story ON items(story);
+CREATE TABLE IF NOT EXISTS bands (
+    band TEXT NOT NULL, story INTEGER NOT NULL, ts REAL NOT NULL, PRIMARY KEY (band, story));
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(title, summary, content='items', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS items_ai AFTER INSERT ON items BEGIN
+    INSERT INTO items_fts(rowid, title, summary) VALUES (new.id, new.title, new.summary); END;
+CREATE TRIGGER IF NOT EXISTS items_ad AFTER DELETE ON items BEGIN
+    INSERT INTO items_fts(items_fts, rowid, title, summary) VALUES ('delete', old.id, old.title, old.summary); END;
+"""
+
+
+class Archive:
+    def __init__(self, path: str = ARCHIVE_PATH, retention_days: int = RETENTION_DAYS):
+        self.retention = retention_days * 86400
+        self.lock = threading.Lock()
+        self.last_prune = 0.0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        try:
+            self.db.executescript(FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError as e:  # SQLite без FTS5 — архив работает, поиск по LIKE
+            logging.info(f"archive: без полнотекстового индекса ({e})")
+            self.fts = False
+
+    def _story_for(self, bands: Iterable[str]) -> int:
+        bands = list(bands)
+        if bands:
+            q = ",".join("?" * len(bands))
+            row = self.db.execute(f"SELECT MIN(story) FROM bands WHERE band IN ({q})", bands).fetchone()
+            if row[0] is not None:
+                return row[0]
+        self.db.execute("INSERT INTO meta(key, value) VALUES ('story', 1) "
+                        "ON CONFLICT(key) DO UPDATE SET value=value+1")
+        return self.db.execute("SELECT value FROM meta WHERE key='story'").fetchone()[0]
+
+    def add_many(self, items) -> int:
+        """Кандидаты сборщика (NewsItem с bands и score); возвращает, сколько ссылок новых."""
+        now = time.time()
+        added = 0
+        with self.lock:
+            self.db.execute("BEGIN")
+            try:
+                for it in items:
+                    cur = self.db.execute("UPDATE items SET score=MAX(score, ?), updated=? WHERE link=?",
+                                          (it.score, now, it.link))
+                    if cur.rowcount:
+                        continue
+                    story = self._story_for(it.bands)
+                    self.db.execute("INSERT INTO items(link, title, summary, source, image, published, seen, "
+                                    "updated, score, story) VALUES (?,?,?,?,?,?,?,?,?,?)",
+                                    (it.link, it.title, it.summary, it.source, it.image, it.published or None,
+                                     now, now, it.score, story))
+                    self.db.executemany("INSERT OR REPLACE INTO bands(band, story, ts) VALUES (?,?,?)",
+                                        [(b, story, now) for b in it.bands])
+                    added += 1
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        if now - self.last_prune > PRUNE_EVERY:
+            self.prune()
+        return added
+
+    def top(self, since: float, limit: int = 50, min_sources: int = 1, by_sources: bool = False) -> List[dict]:
+        """Лучшие сюжеты с момента since: по новости с наибольшей оценкой от каждого сюжета,
+        sources — сколько разных источников писали о сюжете (by_sources — сортировать по нему)."""
+        order = "sources DESC, score DESC" if by_sources else "score DESC"
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT title, summary, link, source, image, published, seen, MAX(score) AS score, story, "
+                "COUNT(DISTINCT source) AS sources FROM items WHERE seen>=? GROUP BY story "
+                f"HAVING sources>=? ORDER BY {order} LIMIT ?", (since, min_sources, limit)).fetchall()
+        return [dict(r) for r in rows]
+
+    def search(self, query: str, since: float = 0.0, limit: int = 20) -> List[dict]:
+        with self.lock:
+            if self.fts:
+                rows = self.db.execute(
+                    "SELECT i.title, i.summary, i.link, i.source, i.score, i.story, i.seen FROM items_fts f "
+                    "JOIN items i ON i.id=f.rowid WHERE items_fts MATCH ? AND i.seen>=? "
+                    "ORDER BY bm25(items_fts) LIMIT ?", (query, since, limit)).fetchall()
+            else:
+                rows = self.db.execute(
+                    "SELECT title, summary, link, source, score, story, seen FROM items "
+                    "WHERE (title LIKE ? OR summary LIKE ?) AND seen>=? ORDER BY score DESC LIMIT ?",
+                    (f"%{query}%", f"%{query}%", since, limit)).fetchall()
+        return [dict(r) for r in rows]
+
+    def count(self, since: float = 0.0) -> int:
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM items WHERE seen>=?", (since,)).fetchone()[0]
+
+    def prune(self):
+        cutoff = time.time() - self.retention
+        with self.lock:
+            self.last_prune = time.time()
+            self.db.execute("DELETE FROM items WHERE seen<?", (cutoff,))
+            self.db.execute("DELETE FROM bands WHERE ts<?", (cutoff,))
+
+
+_default: Optional[Archive] = None
+
+
+def default() -> Archive:
+    global _default
+    if _default is None:
+        _default = Archive()
+    return _default
@@ -0,0 +1,485 @@
+"""
+Офлайн-бенчмарк конвейера новостей: без Variety, Nitter, IG-зеркал и живого Telegram.
+
+Поднимает локальную подмену (StandIn) и направляет на неё весь HTTP процесса
+(HTTP_REWRITE_BASE в http_client: https://variety.com/feed/ → {base}/variety.com/feed/),
+OpenAI — через OPENAI_BASE_URL. Подмена отвечает как настоящие сервисы: RSS с
+картинками и страницами статей (og:image), Nitter RSS, IG-зеркала (JSON r.jina.ai
+и HTML с og:image), TMDB, Wikipedia, Telegram Bot API, chat.completions. Если
+есть каталог записанных ответов (--fixtures, BENCH_FIXTURES/<хост>/<путь>),
+файлы оттуда отдаются вместо синтетики.
+
+Задержка и сбои настраиваются: --latency/--jitter на все ответы, --fail — доля
+ответов 503 (кроме Telegram и OpenAI: там ретраи outbox/SDK растягивают прогон
+на минуты), --host-latency/--host-fail хост=значение — для отдельных хостов.
+
+Замеряются стадии: parse_rss (холодный и повторный проход), parse_nitter_rss,
+оценка кандидатов (CandidatePool.add_many), collect_pass, collect_window,
+publish_best с доставкой через outbox, рубрики и каждая задача из jobs.JOBS.
+Для каждой — число вызовов, пропускная способность, p50/p95/max, ошибки.
+
+По умолчанию код копируется во временный каталог и запускается там: реальные
+.state/ (seen, архив, кэши) и themes.yaml не трогаются.
+
+    python bench.py                                  — все стадии, таблица
+    python bench.py --latency 80 --fail 0.05         — медленная и ненадёжная сеть
+    python bench.py --json out.json                  — результат в файл
+    python bench.py --baseline out.json              — сравнить p50 с прошлым, код 1 при регрессии
+"""
+import os, re, sys, json, dataclasses, time, glob, shutil, random, struct, hashlib, logging, argparse, tempfile, \
+    threading, subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlsplit, parse_qs
+from email.utils import formatdate
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = os.getenv("BENCH_FIXTURES", "")
+
+WORDS = ("Dune", "Batman", "Oscars", "Cannes", "Marvel", "Pixar", "A24", "Nolan", "Villeneuve", "Zendaya",
+         "sequel", "trailer", "box office", "casting", "premiere", "festival", "reboot", "streaming",
+         "director", "first look", "on set", "release date", "review", "teaser")
+FEED_ITEMS = 20
+FEED_PERIOD = 30  # каждые FEED_PERIOD секунд в ленте появляется новая запись
+RELIABLE = ("api.telegram.org", "openai")  # --fail их не касается, только --host-fail
+
+
+# ---------- синтетические ответы ----------
+def jpeg(w: int, h: int, pad: int = 0) -> bytes:
+    """Минимальный JPEG-заголовок (SOI + SOF0) — imgprobe видит формат и размеры, Pillow не нужен."""
+    sof = b"\xff\xc0" + struct.pack(">HBHHB", 11, 8, h, w, 1) + b"\x01\x11\x00"
+    return b"\xff\xd8" + sof + b"\x00" * pad + b"\xff\xd9"
+
+
+def _rng(*key) -> random.Random:
+    return random.Random(hashlib.sha1(repr(key).encode()).hexdigest())
+
+
+def _title(host: str, n: int) -> str:
+    # заголовки общие для разных хостов: одинаковые сюжеты у разных источников склеиваются
+    r = _rng("story", n % 37)
+    words = r.sample(WORDS, 4)
+    return f"{words[0]} {words[1]}: new {words[2]} {words[3]} news #{n % 37}"
+
+
+def rss(host: str, path: str, now: float) -> bytes:
+    tick = int(now // FEED_PERIOD)
+    items = []
+    for k in range(tick, tick - FEED_ITEMS, -1):
+        n = int(hashlib.sha1(f"{host}{path}{k}".encode()).hexdigest()[:6], 16)
+        link = f"https://{host}/article/{n}"
+        media = (f'<media:content url="https://{host}/img/{n}.jpg" medium="image"/>'
+                 if n % 2 else "")
+        items.append(f"<item><title>{_title(host, n)}</title><link>{link}</link><guid>{link}</guid>"
+                     f"<pubDate>{formatdate(k * FEED_PERIOD, usegmt=True)}</pubDate>"
+                     f"<description>Synthetic summary {n} for {host}: premiere, cast and release date.</description>"
+                     f"{media}</item>")
+    return ('<?xml version="1.0" encoding="UTF-8"?><rss version="2.0" '
+            'xmlns:media="http://search.yahoo.com/mrss/"><channel>'
+            f"<title>{host}</title><link>https://{host}/</link>{''.join(items)}</channel></rss>").encode()
+
+
+def nitter_rss(host: str, handle: str, now: float) -> bytes:
+    tick = int(now // FEED_PERIOD)
+    items = []
+    for k in range(tick, tick - 10, -1):
+        n = int(hashlib.sha1(f"{handle}{k}".encode()).hexdigest()[:6], 16)
+        link = f"https://{host}/{handle}/status/{n}"
+        extra = " on set today" if n % 5 == 0 else ""
+        img = f'&lt;img src="https://{host}/pic/media/{n}.jpg" /&gt;' if n % 3 else ""
+        items.append(f"<item><title>{_title(handle, n)}{extra}</title><link>{link}</link>"
+                     f"<pubDate>{formatdate(k * FEED_PERIOD, usegmt=True)}</pubDate>"
+                     f"<description>&lt;p&gt;{handle}: {_title(handle, n)}&lt;/p&gt;{img}</description></item>")
+    return (f'<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>{handle}</title>'
+            f"{''.join(items)}</channel></rss>").encode()
+
+
+def article(host: str, n: str) -> bytes:
+    return (f'<!doctype html><html><head><title>Article {n}</title>'
+            f'<meta property="og:image" content="https://{host}/img/og-{n}.jpg">'
+            f'<meta property="og:description" content="Article {n}"></head>'
+            f"<body>{'<p>text</p>' * 200}</body></html>").encode()
+
+
+def telegram(method: str) -> dict:
+    result = {"message_id": random.randint(1, 10 ** 6), "date": int(time.time())}
+    if method == "sendPhoto":
+        fid = hashlib.sha1(os.urandom(8)).hexdigest()
+        result["photo"] = [{"file_id": f"s{fid}", "width": 320, "height": 240},
+                           {"file_id": f"m{fid}", "width": 1280, "height": 960}]
+    return {"ok": True, "result": result}
+
+
+def openai_completion(body: dict) -> dict:
+    prompt = " ".join(str(m.get("content", "")) for m in body.get("messages", []))
+    if (body.get("response_format") or {}).get("type") == "json_object":
+        n = len(re.findall(r"^### \d+", prompt, re.M))
+        text = json.dumps({"items": [f"Краткое саммари пункта {i + 1}." for i in range(n)]}, ensure_ascii=False)
+    else:
+        text = "1. Фильм (2020) — коротко.\n2. Ещё фильм (2021) — тоже коротко.\nИтог: " + prompt[:80]
+    usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4}
+    usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+    return {"id": "chatcmpl-bench", "object": "chat.completion", "created": int(time.time()),
+            "model": body.get("model", "bench"), "usage": usage,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": text}}]}
+
+
+def tmdb(path: str, q: dict) -> dict:
+    if path.endswith("/search/person"):
+        name = (q.get("query") or ["x"])[0]
+        return {"results": [{"name": name, "profile_path": f"/{hashlib.sha1(name.encode()).hexdigest()[:10]}.jpg"}]}
+    return {"results": [{"title": f"Фильм {i}", "release_date": f"2026-10-{i + 1:02d}",
+                         "vote_average": 5 + i % 5} for i in range(20)]}
+
+
+def wikipedia(path: str, q: dict) -> dict:
+    if path.startswith("/api/rest_v1/feed/onthisday"):
+        return {"events": [{"year": 1900 + i * 5, "text": f"Event {i}: the film premiere of Movie {i}"
+                            if i % 2 else f"Event {i}: a treaty was signed"} for i in range(20)]}
+    return {"query": {"categorymembers": [{"title": f"Person {i} ({'actress' if i % 3 else 'politician'})"}
+                                          for i in range(50)]}}
+
+
+def ig_json(user: str) -> bytes:
+    return json.dumps({"graphql": {"user": {"edge_owner_to_timeline_media": {"edges": [{"node": {
+        "display_url": f"https://scontent.cdninstagram.com/v/{user}/latest.jpg",
+        "edge_media_to_caption": {"edges": [{"node": {"text": f"Новый кадр @{user}"}}]}}}]}}}}).encode()
+
+
+def ig_html(host: str, user: str) -> bytes:
+    return (f'<!doctype html><html><head><meta property="og:image" content="https://{host}/media/{user}.jpg">'
+            f'<meta property="og:description" content="@{user} on {host}"></head><body></body></html>').encode()
+
+
+# ---------- подмена ----------
+class StandIn:
+    """HTTP-сервер на 127.0.0.1: первый сегмент пути — исходный хост (см. HTTP_REWRITE_BASE)."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.5, fail: float = 0.0,
+                 host_latency: Optional[Dict[str, float]] = None, host_fail: Optional[Dict[str, float]] = None,
+                 fixtures: str = FIXTURES, image_pad: int = 48 * 1024):
+        self.latency, self.jitter, self.fail = latency, jitter, fail
+        self.host_latency = host_latency or {}
+        self.host_fail = host_fail or {}
+        self.fixtures = fixtures
+        self.image = jpeg(1280, 720, image_pad)
+        self.hits: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        stand = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *a):
+                pass
+
+            def do_GET(self):
+                stand.handle(self, "GET")
+
+            def do_HEAD(self):
+                stand.handle(self, "HEAD")
+
+            def do_POST(self):
+                stand.handle(self, "POST")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self) -> "StandIn":
+        threading.Thread(target=self.server.serve_forever, name="standin", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+    def _delay(self, host: str):
+        ms = self.host_latency.get(host, self.latency)
+        if ms:
+            time.sleep(ms / 1000 * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def _fixture(self, host: str, path: str) -> Optional[bytes]:
+        if not self.fixtures:
+            return None
+        root = os.path.abspath(self.fixtures)
+        p = os.path.normpath(os.path.join(root, host, path.strip("/") or "index"))
+        if p.startswith(root + os.sep) and os.path.isfile(p):
+            with open(p, "rb") as f:
+                return f.read()
+        return None
+
+    def handle(self, req: BaseHTTPRequestHandler, method: str):
+        parts = urlsplit(req.path)
+        seg = parts.path.lstrip("/").split("/", 1)
+        host, path = seg[0], "/" + (seg[1] if len(seg) > 1 else "")
+        body = req.rfile.read(int(req.headers.get("Content-Length") or 0)) if method == "POST" else b""
+        with self.lock:
+            self.hits[host] = self.hits.get(host, 0) + 1
+        self._delay(host)
+        fail = self.host_fail.get(host, 0.0 if host in RELIABLE else self.fail)
+        if fail and random.random() < fail:
+            return self._send(req, 503, b"unavailable", "text/plain", method)
+        try:
+            status, data, ctype, headers = self.route(host, path, parse_qs(parts.query), body, req)
+        except Exception as e:
+            status, data, ctype, headers = 500, str(e).encode(), "text/plain", {}
+        self._send(req, status, data, ctype, method, headers)
+
+    def route(self, host: str, path: str, q: dict, body: bytes, req):
+        fx = self._fixture(host, path)
+        if fx is not None:
+            ctype = "application/json" if fx[:1] in (b"{", b"[") else "application/xml" if fx[:5] == b"<?xml" \
+                else "image/jpeg" if fx[:2] == b"\xff\xd8" else "text/html"
+            return 200, fx, ctype, {}
+        if host == "api.telegram.org":
+            return 200, json.dumps(telegram(path.rsplit("/", 1)[-1])).encode(), "application/json", {}
+        if host == "openai":
+            return 200, json.dumps(openai_completion(json.loads(body or b"{}"))).encode(), "application/json", {}
+        if host == "api.themoviedb.org":
+            return 200, json.dumps(tmdb(path, q)).encode(), "application/json", {}
+        if host == "en.wikipedia.org":
+            return 200, json.dumps(wikipedia(path, q)).encode(), "application/json", {}
+        if path.endswith((".jpg", ".jpeg", ".png", ".webp")) or host == "image.tmdb.org":
+            return self._image(req)
+        if host == "r.jina.ai":
+            user = re.sub(r"^/https?://(www\.)?instagram\.com/", "", path).strip("/")
+            return 200, ig_json(user), "application/json", {}
+        if path.startswith(("/profile/", "/u/", "/v/")):
+            return 200, ig_html(host, path.rstrip("/").rsplit("/", 1)[-1]), "text/html", {}
+        if path.startswith("/article/"):
+            return 200, article(host, path.rsplit("/", 1)[-1]), "text/html", {}
+        now = time.time()
+        etag = f'"{int(now // FEED_PERIOD)}"'
+        if req.headers.get("If-None-Match") == etag:
+            return 304, b"", "application/xml", {"ETag": etag}
+        m = re.match(r"^/([^/]+)/rss$", path)
+        data = nitter_rss(host, m.group(1), now) if m and "nitter" in host else rss(host, path, now)
+        return 200, data, "application/rss+xml", {"ETag": etag}
+
+    def _image(self, req):
+        rng = req.headers.get("Range", "")
+        m = re.match(r"bytes=(\d+)-(\d*)", rng)
+        if m:
+            a = int(m.group(1))
+            b = min(int(m.group(2) or len(self.image) - 1), len(self.image) - 1)
+            return 206, self.image[a:b + 1], "image/jpeg", {"Content-Range": f"bytes {a}-{b}/{len(self.image)}"}
+        return 200, self.image, "image/jpeg", {}
+
+    @staticmethod
+    def _send(req, status: int, data: bytes, ctype: str, method: str, headers: Optional[dict] = None):
+        try:
+            req.send_response(status)
+            req.send_header("Content-Type", ctype)
+            req.send_header("Content-Length", "0" if status == 304 else str(len(data)))
+            for k, v in (headers or {}).items():
+                req.send_header(k, v)
+            req.end_headers()
+            if method != "HEAD" and status != 304:
+                req.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # клиент оборвал загрузку (гонка IG-зеркал) — это нормально
+
+
+# ---------- замеры ----------
+class Stage:
+    def __init__(self, name: str):
+        self.name = name
+        self.times: List[float] = []
+        self.items = 0
+        self.errors = 0
+
+    def pct(self, p: float) -> float:
+        if not self.times:
+            return 0.0
+        s = sorted(self.times)
+        return s[min(len(s) - 1, int(round(p * (len(s) - 1))))]
+
+    def row(self) -> dict:
+        total = sum(self.times)
+        return {"n": len(self.times), "items": self.items, "errors": self.errors, "total_s": round(total, 4),
+                "per_s": round(len(self.times) / total, 2) if total else 0.0,
+                "items_per_s": round(self.items / total, 1) if total else 0.0,
+                "p50_ms": round(self.pct(0.5) * 1000, 2), "p95_ms": round(self.pct(0.95) * 1000, 2),
+                "max_ms": round(max(self.times, default=0.0) * 1000, 2)}
+
+
+class Bench:
+    def __init__(self):
+        self.stages: Dict[str, Stage] = {}
+
+    def timed(self, name: str, fn: Callable, *args, **kw):
+        """fn(*args) с замером; число результатов — len() ответа или 1 за True."""
+        st = self.stages.setdefault(name, Stage(name))
+        t0 = time.perf_counter()
+        try:
+            res = fn(*args, **kw)
+        except Exception as e:
+            st.times.append(time.perf_counter() - t0)
+            st.errors += 1
+            logging.warning(f"bench {name}: {e}")
+            return None
+        st.times.append(time.perf_counter() - t0)
+        if isinstance(res, (list, tuple, dict)):
+            st.items += len(res)
+        elif res is True:
+            st.items += 1
+        elif res is False:
+            st.errors += 1
+        return res
+
+    def report(self) -> Dict[str, dict]:
+        return {name: st.row() for name, st in self.stages.items()}
+
+
+def format_table(rows: Dict[str, dict]) -> str:
+    out = [f"{'стадия':28s} {'n':>5s} {'шт':>6s} {'ош':>4s} {'всего,с':>8s} {'выз/с':>8s} "
+           f"{'шт/с':>8s} {'p50,мс':>9s} {'p95,мс':>9s} {'max,мс':>9s}"]
+    for name, r in rows.items():
+        out.append(f"{name:28s} {r['n']:5d} {r['items']:6d} {r['errors']:4d} {r['total_s']:8.2f} "
+                   f"{r['per_s']:8.2f} {r['items_per_s']:8.1f} {r['p50_ms']:9.2f} {r['p95_ms']:9.2f} "
+                   f"{r['max_ms']:9.2f}")
+    return "\n".join(out)
+
+
+def compare(rows: Dict[str, dict], baseline: Dict[str, dict], tolerance: float, floor_ms: float = 5.0) -> List[str]:
+    """Стадии, у которых p50 вырос больше чем на tolerance (мелочь до floor_ms не считаем)."""
+    bad = []
+    for name, r in rows.items():
+        old = baseline.get(name)
+        if not old or not old.get("p50_ms"):
+            continue
+        if r["p50_ms"] > old["p50_ms"] * (1 + tolerance) and r["p50_ms"] - old["p50_ms"] > floor_ms:
+            bad.append(f"{name}: p50 {old['p50_ms']:.1f} → {r['p50_ms']:.1f} мс")
+    return bad
+
+
+# ---------- сценарий ----------
+def run_stages(args, stand: StandIn) -> Dict[str, dict]:
+    import main, jobs, outbox, llm  # после настройки окружения: модули читают его при импорте
+
+    b = Bench()
+    box = outbox.default(main.TELEGRAM_BOT_TOKEN)
+    nitter = main.nitter_rss_urls()
+
+    for rep in range(args.reps):
+        main.HWM = main.HighWater()  # каждая итерация — как первый проход: все записи ленты новые
+        for u in main.RSS_LIST:
+            b.timed("parse_rss (cold)" if rep == 0 else "parse_rss", main.parse_rss, u)
+        for u in nitter:
+            b.timed("parse_nitter_rss", main.parse_nitter_rss, u)
+    for u in main.RSS_LIST:  # лента не изменилась — 304 и ничего нового
+        b.timed("parse_rss (304)", main.parse_rss, u)
+
+    main.HWM = main.HighWater()
+    items = [it for u in main.RSS_LIST + nitter
+             for it in (main.parse_nitter_rss(u) if main.is_nitter(u) else main.parse_rss(u))]
+    for _ in range(args.reps * 5):
+        batch = [dataclasses.replace(it) for it in items]  # свежие копии: пул пишет оценку и полосы в объект
+        b.timed("score (add_many)", main.CandidatePool().add_many, batch)
+        b.stages["score (add_many)"].items += len(batch)
+
+    targets = main.RSS_LIST + nitter + [f"ig:@{u}" for u in main.ACTRESS_IG[:args.ig]]
+    for _ in range(args.reps):
+        main.HWM = main.HighWater()
+        pool = main.CandidatePool()
+        b.timed("collect_pass", main.collect_pass, pool, list(targets))
+        b.stages["collect_pass"].items += len(pool)
+
+    cands = b.timed("collect_window", main.collect_window, args.window / 60) or []
+    for _ in range(args.publish):
+        b.timed("publish_best", main.publish_best, cands)
+    b.timed("outbox flush", lambda: box.flush(60) == 0)
+
+    b.timed("rubric weekly", main.post_weekly_ru_cinemas)
+    b.timed("rubric birthday", main.post_birthday)
+    b.timed("rubric onset", main.post_on_set)
+    b.timed("rubric actress", main.post_actress, "bench")
+    b.timed("outbox flush", lambda: box.flush(60) == 0)
+
+    for name in jobs.JOBS:
+        b.timed(f"job {name}", jobs.run, name)
+    b.timed("outbox flush", lambda: box.flush(60) == 0)
+
+    print(f"outbox: {box.stats()}")
+    print(f"llm: {llm.default(main.OPENAI_API_KEY).stats()}")
+    print(f"запросов к подмене: {dict(sorted(stand.hits.items(), key=lambda x: -x[1])[:12])}")
+    return b.report()
+
+
+def inner(args) -> int:
+    stand = StandIn(args.latency, args.jitter, args.fail, _pairs(args.host_latency, float),
+                    _pairs(args.host_fail, float), fixtures=args.fixtures).start()
+    os.environ.update({
+        "HTTP_REWRITE_BASE": stand.base, "OPENAI_BASE_URL": f"{stand.base}/openai/v1",
+        "TELEGRAM_BOT_TOKEN": "0:bench", "TELEGRAM_CHANNEL_ID": "@bench",
+        "OPENAI_API_KEY": "bench", "TMDB_API_KEY": "bench",
+        "TG_CHAT_INTERVAL": "0", "CYCLE_PAUSE_SEC": str(args.pause), "JOBS_IN_PROCESS": "false",
+        "HTTP_BACKOFF": "0.05",
+    })
+    rows = run_stages(args, stand)
+    stand.stop()
+    print(format_table(rows))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "stages": rows}, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            bad = compare(rows, json.load(f).get("stages", {}), args.tolerance)
+        for line in bad:
+            print(f"РЕГРЕССИЯ {line}")
+        return 1 if bad else 0
+    return 0
+
+
+def _pairs(items: List[str], conv) -> Dict[str, float]:
+    out = {}
+    for s in items or []:
+        k, _, v = s.partition("=")
+        out[k] = conv(v)
+    return out
+
+
+def isolated(argv: List[str]) -> int:
+    """Копия кода во временном каталоге: свой .state, themes.yaml не двигается."""
+    tmp = tempfile.mkdtemp(prefix="bench-")
+    try:
+        for p in glob.glob(os.path.join(BASE, "*.py")) + glob.glob(os.path.join(BASE, "*.yaml")):
+            shutil.copy2(p, tmp)
+        # пути к файлам результата — относительно того места, откуда запустили
+        argv = [os.path.abspath(a) if prev in ("--json", "--baseline", "--fixtures") else a
+                for prev, a in zip([""] + argv, argv)]
+        return subprocess.call([sys.executable, os.path.join(tmp, "bench.py"), "--inner"] + argv, cwd=tmp)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def parse_args(argv: List[str]):
+    ap = argparse.ArgumentParser(description="Офлайн-бенчмарк конвейера новостей")
+    ap.add_argument("--latency", type=float, default=20, help="задержка ответа подмены, мс")
+    ap.add_argument("--jitter", type=float, default=0.5, help="разброс задержки, доля (0.5 → ±50%%)")
+    ap.add_argument("--fail", type=float, default=0.0, help="доля ответов 503")
+    ap.add_argument("--host-latency", action="append", metavar="ХОСТ=МС", help="задержка для хоста")
+    ap.add_argument("--host-fail", action="append", metavar="ХОСТ=P", help="доля 503 для хоста")
+    ap.add_argument("--fixtures", default=FIXTURES, help="каталог записанных ответов <хост>/<путь>")
+    ap.add_argument("--reps", type=int, default=3, help="повторов на стадию")
+    ap.add_argument("--window", type=float, default=15, help="длина collect_window, с")
+    ap.add_argument("--pause", type=int, default=5, help="CYCLE_PAUSE_SEC внутри окна, с")
+    ap.add_argument("--publish", type=int, default=3, help="сколько раз вызвать publish_best")
+    ap.add_argument("--ig", type=int, default=4, help="сколько IG-профилей в collect_pass")
+    ap.add_argument("--json", help="записать результат в файл")
+    ap.add_argument("--baseline", help="сравнить с прошлым результатом (--json)")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="допустимый рост p50, доля")
+    ap.add_argument("--inplace", action="store_true", help="без копии во временный каталог (пишет в .state/)")
+    ap.add_argument("--inner", action="store_true", help=argparse.SUPPRESS)
+    return ap.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(message)s")
+    argv = sys.argv[1:]
+    args = parse_args(argv)
+    if args.inner or args.inplace:
+        logging.getLogger().setLevel(logging.INFO if os.getenv("BENCH_VERBOSE") else logging.WARNING)
+        sys.exit(inner(args))
+    sys.exit(isolated(argv))
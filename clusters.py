@@ -0,0 +1,89 @@
+"""
+Склейка почти одинаковых новостей из разных источников в «сюжеты».
+
+Текст (заголовок + анонс) режется на пословные биграммы, по ним считается
+MinHash-подпись, подпись делится на BANDS полос по ROWS значений. Две новости
+попадают в один сюжет, если совпала хотя бы одна полоса (LSH): порог ≈ 0.6 по
+Жаккару. Всё линейно по числу новостей — без попарных сравнений.
+Хэши детерминированы между процессами, поэтому ключи полос можно хранить
+в анти-дублях и узнавать вчерашний сюжет под новой ссылкой.
+"""
+import re, random, hashlib
+from typing import Dict, List, Set, Tuple
+
+BANDS = 8
+ROWS = 4
+NUM_PERM = BANDS * ROWS
+_P = (1 << 61) - 1
+_rng = random.Random(20240917)
+_PERMS = [(_rng.randrange(1, _P), _rng.randrange(0, _P)) for _ in range(NUM_PERM)]
+_word_rx = re.compile(r"\w+", re.U)
+STOP = {"the", "a", "an", "of", "in", "on", "to", "for", "and", "with", "at", "by", "is",
+        "и", "в", "на", "с", "по", "о", "к", "из", "за", "для", "от"}
+
+
+def _h64(s: str) -> int:
+    return int.from_bytes(hashlib.blake2b(s.encode("utf-8", "ignore"), digest_size=8).digest(), "big")
+
+
+def shingles(text: str) -> Set[int]:
+    words = [w for w in _word_rx.findall((text or "").lower()) if w not in STOP]
+    if len(words) < 2:
+        return {_h64(w) for w in words}
+    return {_h64(words[i] + " " + words[i + 1]) for i in range(len(words) - 1)}
+
+
+def signature(text: str) -> List[int]:
+    sh = shingles(text)
+    if not sh:
+        return []
+    return [min((a * x + b) % _P for x in sh) for a, b in _PERMS]
+
+
+def band_keys(text: str) -> Tuple[str, ...]:
+    """Ключи LSH-полос; пусто, если в тексте нет слов."""
+    sig = signature(text)
+    if not sig:
+        return ()
+    return tuple(f"{i}:{hashlib.blake2b(repr(sig[i*ROWS:(i+1)*ROWS]).encode(), digest_size=6).hexdigest()}"
+                 for i in range(BANDS))
+
+
+class StoryIndex:
+    """Сюжеты текущего окна: ключ полосы → сюжет, сюжет → источники (union-find)."""
+
+    def __init__(self):
+        self.bucket: Dict[str, int] = {}
+        self.parent: Dict[int, int] = {}
+        self.sources: Dict[int, Set[str]] = {}
+        self.next_id = 1
+
+    def find(self, cid: int) -> int:
+        root = cid
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[cid] != root:  # сжатие пути
+            self.parent[cid], cid = root, self.parent[cid]
+        return root
+
+    def assign(self, keys: Tuple[str, ...], source: str) -> Tuple[int, List[int]]:
+        """Кладёт новость в сюжет. Возвращает (сюжет, поглощённые сюжеты)."""
+        roots = sorted({self.find(self.bucket[k]) for k in keys if k in self.bucket})
+        if roots:
+            cid, merged = roots[0], roots[1:]
+        else:
+            cid, merged = self.next_id, []
+            self.next_id += 1
+            self.parent[cid] = cid
+            self.sources[cid] = set()
+        for m in merged:
+            self.parent[m] = cid
+            self.sources[cid] |= self.sources.pop(m, set())
+        for k in keys:
+            self.bucket.setdefault(k, cid)
+        self.sources[cid].add(source)
+        return cid, merged
+
+    def size(self, cid: int) -> int:
+        """Сколько разных источников пишут об этом сюжете."""
+        return len(self.sources.get(self.find(cid), ()))
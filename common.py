@@ -1,6 +1,10 @@
-import os, time, json, logging, requests, re
+import os, time, json, logging, requests
 from typing import Optional, List
-from bs4 import BeautifulSoup
+import htmlmeta
+import http_client
+import llm
+import metrics
+import outbox
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
 TELEGRAM_CHANNEL_ID = os.getenv("TELEGRAM_CHANNEL_ID", "")
@@ -9,6 +13,8 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 LANGUAGE = os.getenv("LANGUAGE", "ru")
 CAPTION_MAX = int(os.getenv("CAPTION_MAX", "950"))
 ENABLE_POLLS = os.getenv("ENABLE_POLLS", "true").lower() == "true"
+TG_WAIT_SEC = float(os.getenv("TG_WAIT_SEC", "30"))
+TG_DRAIN_SEC = float(os.getenv("TG_DRAIN_SEC", "300"))  # сколько разовый скрипт ждёт свою очередь перед выходом
 
 # Журнальный дерзкий тон
 NEWS_TONE = os.getenv("NEWS_TONE", 
@@ -16,11 +22,15 @@ NEWS_TONE = os.getenv("NEWS_TONE",
     "1–2 предложения, нейтрально-позитивный тон, без спойлеров, клише и CAPS.")
 
 def http_get(url: str, timeout: int = 15) -> Optional[requests.Response]:
+    source = metrics.source_of(url)
+    t0, r = time.perf_counter(), None
     try:
-        r = requests.get(url, timeout=timeout, headers={"User-Agent": "UsyPaskalyaBot/1.1"})
+        r = http_client.shared().get(url, timeout=timeout)
         r.raise_for_status()
+        metrics.fetched(source, time.perf_counter() - t0, r)
         return r
     except Exception as e:
+        metrics.fetched(source, time.perf_counter() - t0, r, error=e)
         logging.warning(f"GET failed: {url} ({e})")
         return None
 
@@ -30,44 +40,56 @@ def build_caption(title: str, summary: str) -> str:
     cap = f"<b>{safe_title}</b>\n{safe_summary}"
     return cap[:CAPTION_MAX-1] + "…" if len(cap) > CAPTION_MAX else cap
 
-def send_telegram(text: str) -> bool:
+_undelivered: List[int] = []  # поставленное этим процессом, но не дождавшееся итога в _tg
+
+def _tg(method: str, data: dict) -> bool:
+    """Через общую очередь outbox: ставим и ждём итога не дольше TG_WAIT_SEC.
+    Не дождались — сообщение не потеряно: в боте его допошлёт отправитель,
+    а скрипт из cron дожидается его в drain_outbox() перед выходом."""
     if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHANNEL_ID:
         logging.error("TELEGRAM_BOT_TOKEN или TELEGRAM_CHANNEL_ID не заданы")
         return False
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-    data = {"chat_id": TELEGRAM_CHANNEL_ID, "text": text, "parse_mode": "HTML", "disable_web_page_preview": False}
-    try:
-        r = requests.post(url, data=data, timeout=15)
-        ok = r.status_code == 200 and r.json().get("ok", False)
-        if not ok: logging.error(f"Telegram error: {r.status_code} {r.text}")
-        return ok
-    except Exception as e:
-        logging.error(f"Telegram request failed: {e}")
+    box = outbox.default(TELEGRAM_BOT_TOKEN)
+    mid = box.enqueue(method, data)
+    metrics.inc("tg_enqueued_total", method=method)
+    st = box.wait(mid, TG_WAIT_SEC)
+    if st == "failed":
+        logging.error(f"Telegram {method}: не доставлено (#{mid})")
         return False
+    if st != "sent":
+        logging.warning(f"Telegram {method}: ещё в очереди (#{mid}), уйдёт позже")
+        _undelivered.append(mid)
+    return True
 
-def send_telegram_photo(image_url: str, caption: str, buttons: Optional[List[dict]] = None) -> bool:
-    if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHANNEL_ID:
-        logging.error("TELEGRAM_BOT_TOKEN или TELEGRAM_CHANNEL_ID не заданы")
+def drain_outbox() -> bool:
+    """Для запуска из cron (if __name__ == "__main__"): до выхода ждём не дольше TG_DRAIN_SEC,
+    пока уйдёт всё, что этот процесс поставил в очередь. False — что-то так и не доставлено."""
+    if not _undelivered:
+        return True
+    box = outbox.default(TELEGRAM_BOT_TOKEN)
+    end = time.time() + TG_DRAIN_SEC
+    left = [mid for mid in _undelivered if box.wait(mid, max(0.0, end - time.time())) != "sent"]
+    _undelivered.clear()
+    if left:
+        logging.error(f"Telegram: не доставлено к выходу {left} (в очереди их допошлёт бот, если запущен)")
         return False
-    api = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendPhoto"
+    return True
+
+def send_telegram(text: str) -> bool:
+    data = {"chat_id": TELEGRAM_CHANNEL_ID, "text": text, "parse_mode": "HTML", "disable_web_page_preview": False}
+    return _tg("sendMessage", data)
+
+def send_telegram_photo(image_url: str, caption: str, buttons: Optional[List[dict]] = None) -> bool:
     data = {"chat_id": TELEGRAM_CHANNEL_ID, "photo": image_url, "caption": caption, "parse_mode":"HTML"}
     if buttons:
         data["reply_markup"] = json.dumps({"inline_keyboard":[buttons]})
-    try:
-        r = requests.post(api, data=data, timeout=20)
-        ok = r.status_code == 200 and r.json().get("ok", False)
-        if not ok: logging.error(f"Telegram sendPhoto error: {r.status_code} {r.text}")
-        return ok
-    except Exception as e:
-        logging.error(f"Telegram sendPhoto failed: {e}")
-        return False
+    return _tg("sendPhoto", data)
 
 def send_poll(question: str, options: list) -> bool:
     if not ENABLE_POLLS: 
         return True
     if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHANNEL_ID:
         return False
-    api = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendPoll"
     data = {
         "chat_id": TELEGRAM_CHANNEL_ID,
         "question": question[:255],
@@ -75,78 +97,44 @@ def send_poll(question: str, options: list) -> bool:
         "is_anonymous": False,
         "allows_multiple_answers": False
     }
-    try:
-        r = requests.post(api, data=data, timeout=15)
-        ok = r.status_code == 200 and r.json().get("ok", False)
-        if not ok: logging.error(f"Telegram sendPoll error: {r.status_code} {r.text}")
-        return ok
-    except Exception as e:
-        logging.error(f"Telegram sendPoll failed: {e}")
-        return False
+    return _tg("sendPoll", data)
+
+SYSTEM_PROMPT = f"{NEWS_TONE} Всегда отвечай на русском языке, даже если исходная новость на английском или другом языке."
 
 def gpt_summarize(prompt: str, model="gpt-4o-mini", temperature=0.2, max_tokens=220, retries=3):
-    key = OPENAI_API_KEY
-    if not key:
-        return None
-    try:
-        from openai import OpenAI
-        client = OpenAI(api_key=key)
-        delay = 5
-        for i in range(retries):
-            try:
-                resp = client.chat.completions.create(
-                    model=model,
-                    messages=[{"role":"system","content": f"{NEWS_TONE} Всегда отвечай на русском языке, даже если исходная новость на английском или другом языке."}, {"role":"user","content": prompt}],
-                    temperature=temperature,
-                    max_tokens=max_tokens,
-                    timeout=30
-                )
-                return resp.choices[0].message.content.strip()
-            except Exception as e:
-                msg = str(e)
-                if "429" in msg or "rate_limit" in msg.lower():
-                    time.sleep(delay); delay *= 2; continue
-                raise
-    except Exception as e:
-        logging.warning(f"GPT summarize failed: {e}")
-    return None
+    # один клиент на процесс, кэш ответов и повторы (retries оставлен для совместимости) — в llm.py;
+    # текст рубрик по расписанию кэшируется в пределах дня: с постоянной DIGEST_TOPIC промпт
+    # каждый день тот же, а пост должен быть новым
+    with metrics.timer("gpt_summarize_seconds"):
+        text = llm.default(OPENAI_API_KEY).complete(prompt, system=SYSTEM_PROMPT, model=model,
+                                                    temperature=temperature, max_tokens=max_tokens,
+                                                    scope=time.strftime("%Y-%m-%d"))
+    metrics.inc("gpt_summarize_total", result="ok" if text else "empty")
+    return text
+
+def gpt_summarize_many(prompts: List[str], model="gpt-4o-mini", temperature=0.2, max_tokens=220) -> List[Optional[str]]:
+    """Несколько саммари одним запросом к модели (см. llm.LLM.batch)."""
+    return llm.default(OPENAI_API_KEY).batch(prompts, system=SYSTEM_PROMPT, model=model,
+                                             temperature=temperature, max_tokens=max_tokens)
 
-yt_rx = re.compile(r"(https?://(?:www\.)?youtu(?:\.be|be\.com)/(?:watch\?v=|embed/|shorts/)?[A-Za-z0-9_\-]{6,})")
 def extract_youtube_url(html_or_url: str) -> Optional[str]:
-    # если это URL страницы — качаем
+    # если это URL страницы — читаем потоком, пока не встретим ссылку на YouTube
     if html_or_url.startswith("http"):
-        r = http_get(html_or_url, timeout=12)
-        if not r or not r.text: 
+        meta = htmlmeta.fetch_meta(html_or_url, timeout=12, need=("youtube",))
+        if not meta:
             return None
-        s = r.text
     else:
-        s = html_or_url
-    m = yt_rx.search(s)
-    if m:
-        url = m.group(1)
-        # нормализуем в формат watch?v=
-        if "/embed/" in url:
-            vid = url.split("/embed/")[1].split("?")[0]
-            return f"https://www.youtube.com/watch?v={vid}"
-        if "/shorts/" in url:
-            vid = url.split("/shorts/")[1].split("?")[0]
-            return f"https://www.youtube.com/watch?v={vid}"
-        return url
+        meta = htmlmeta.parse_html(html_or_url)
+    if meta.get("youtube"):
+        return meta["youtube"]
     # og:video?
-    try:
-        soup = BeautifulSoup(s, "html.parser")
-        meta = soup.find("meta", property="og:video") or soup.find("meta", attrs={"name":"og:video"})
-        if meta and "youtube" in meta.get("content",""):
-            return meta["content"]
-    except Exception:
-        pass
+    video = meta.get("og:video", "")
+    if "youtube" in video:
+        return video
     return None
 
 def pick_og_image(url: str) -> Optional[str]:
-    r = http_get(url, timeout=10)
-    if r and r.text:
-        soup = BeautifulSoup(r.text, "html.parser")
-        meta = soup.find("meta", property="og:image") or soup.find("meta", attrs={"name":"og:image"})
-        if meta and meta.get("content"):
-            return meta["content"]
+    meta = htmlmeta.fetch_meta(url, timeout=10, need=())
+    if meta and meta.get("og:image"):
+        return meta["og:image"]
     return None
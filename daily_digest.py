@@ -2,15 +2,16 @@
 Ежедневная подборка: бот публикует 5 фильмов на заданную тему.
 Тему берём из themes.yaml (крутим по кругу) или из переменной DIGEST_TOPIC.
 """
-import os, json, logging, time, random, yaml
+import os, json, logging, time, random
 from datetime import datetime
-from common import send_telegram_photo, send_telegram, build_caption, gpt_summarize, pick_og_image
+from common import send_telegram_photo, send_telegram, build_caption, gpt_summarize, pick_og_image, drain_outbox
 
 DIGEST_TOPIC = os.getenv("DIGEST_TOPIC", "").strip()
 DIGEST_SIZE = int(os.getenv("DIGEST_SIZE", "5"))
 
 def load_next_topic() -> str:
-    path = "themes.yaml"
+    import yaml
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "themes.yaml")
     try:
         with open(path, "r", encoding="utf-8") as f:
             data = yaml.safe_load(f) or {}
@@ -47,3 +48,4 @@ def main():
 
 if __name__ == "__main__":
     main()
+    raise SystemExit(0 if drain_outbox() else 1)
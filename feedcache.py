@@ -0,0 +1,133 @@
+"""
+Кэш RSS-лент с условными GET-запросами (ETag / Last-Modified).
+
+На каждую ленту в .state/feeds/ лежат два файла: <sha1>.json с валидаторами
+и <sha1>.xml с последним телом. Повторный запрос уходит с If-None-Match /
+If-Modified-Since; на 304 тело не качается и заново не разбирается — отдаём
+уже разобранную ленту из памяти (или один раз разбираем сохранённое тело).
+Общий для main.py, weekly_digest.py и trends.py.
+"""
+import os, json, time, hashlib, logging, threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import requests
+
+import http_client
+import metrics
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(BASE, ".state", "feeds")
+os.makedirs(CACHE_DIR, exist_ok=True)
+
+_session = http_client.shared()
+
+# url -> разобранная лента (живёт в пределах процесса); только ленты с валидаторами —
+# без ETag/Last-Modified 304 не придёт и разобранное не пригодится. LRU: URL Nitter
+# меняются вместе с зеркалом, старые вытесняются.
+_parsed: "OrderedDict[str, dict]" = OrderedDict()
+PARSED_MAX = int(os.getenv("FEEDCACHE_PARSED_MAX", "300"))
+_lock = threading.Lock()
+STATS = {"fresh": 0, "not_modified": 0, "error": 0}
+
+
+def _parse(body):
+    import feedparser  # тяжёлый импорт — только когда реально разбираем ленту
+    with metrics.stage("feedparse"):
+        return feedparser.parse(body)
+
+
+def _paths(url: str) -> Tuple[str, str]:
+    k = hashlib.sha1(url.encode("utf-8", "ignore")).hexdigest()
+    return os.path.join(CACHE_DIR, k + ".json"), os.path.join(CACHE_DIR, k + ".xml")
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _load_meta(meta_path: str, body_path: str) -> dict:
+    # валидаторы без сохранённого тела бесполезны: на 304 нечего будет отдать
+    if not (os.path.isfile(meta_path) and os.path.isfile(body_path)):
+        return {}
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def _remember(url: str, feed: dict):
+    with _lock:
+        _parsed[url] = feed
+        _parsed.move_to_end(url)
+        while len(_parsed) > PARSED_MAX:
+            _parsed.popitem(last=False)
+
+
+def _bump(key: str):
+    with _lock:
+        STATS[key] += 1
+
+
+def fetch_feed(url: str, session: Optional[requests.Session] = None,
+               timeout: int = 15, retries: Optional[int] = None) -> Tuple[Optional[dict], bool]:
+    """Возвращает (feed, fresh).
+    feed — результат feedparser (None при ошибке), fresh — пришло ли новое тело.
+    При 304 feed берётся из кэша и fresh=False.
+    retries — повторы http_client (None — как у клиента; на обычной Session не передаётся)."""
+    meta_path, body_path = _paths(url)
+    meta = _load_meta(meta_path, body_path)
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    source = metrics.source_of(url)
+    t0, r = time.perf_counter(), None
+    try:
+        extra = {} if retries is None else {"retries": retries}
+        r = (session or _session).get(url, timeout=timeout, headers=headers, **extra)
+        metrics.fetched(source, time.perf_counter() - t0, r)
+        if r.status_code == 304 and meta:
+            _bump("not_modified")
+            with _lock:
+                feed = _parsed.get(url)
+                if feed is not None:
+                    _parsed.move_to_end(url)
+            if feed is None:
+                with open(body_path, "rb") as f:
+                    feed = _parse(f.read())
+                _remember(url, feed)
+            return feed, False
+        r.raise_for_status()
+    except Exception as e:
+        if r is None:
+            metrics.fetched(source, time.perf_counter() - t0, error=e)
+        else:
+            metrics.inc("fetch_errors_total", source=source, error=type(e).__name__)
+        _bump("error")
+        logging.getLogger("err").info(f"feed fail {url}: {e}")
+        return None, False
+
+    body = r.content
+    feed = _parse(body)
+    new_meta = {"etag": r.headers.get("ETag"),
+                "last_modified": r.headers.get("Last-Modified"),
+                "ts": time.time()}
+    try:
+        if new_meta["etag"] or new_meta["last_modified"]:
+            _write_atomic(body_path, body)
+            _write_atomic(meta_path, json.dumps(new_meta).encode("utf-8"))
+    except Exception as e:
+        logging.warning(f"feedcache save {url}: {e}")
+    if new_meta["etag"] or new_meta["last_modified"]:
+        _remember(url, feed)
+    else:
+        with _lock:
+            _parsed.pop(url, None)
+    _bump("fresh")
+    return feed, True
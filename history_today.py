@@ -2,16 +2,18 @@
 Сегодня в истории кино: берём события дня с Wikipedia 'on this day' API,
 фильтруем кино-события и делаем лаконичный пост.
 """
-import os, time, requests, logging, datetime as dt
-from common import gpt_summarize, send_telegram, build_caption
+import os, time, logging, datetime as dt
+import http_client
+from common import gpt_summarize, send_telegram, build_caption, drain_outbox
+import kwmatch
 
 ENPOINT = "https://en.wikipedia.org/api/rest_v1/feed/onthisday/events/{month}/{day}"
-KEYWORDS = ["film", "movie", "cinema", "director", "actor", "actress", "Academy Award", "Oscars", "Cannes", "Venice Film Festival", "Sundance"]
+KEYWORDS = kwmatch.matcher("history")  # film*/movie*/Oscar*… — см. keywords.yaml
 
 def fetch_events():
     today = dt.datetime.utcnow()
     url = ENPOINT.format(month=today.month, day=today.day)
-    r = requests.get(url, timeout=15, headers={"User-Agent":"UsyPaskalyaBot/1.1"})
+    r = http_client.shared().get(url, timeout=15)
     r.raise_for_status()
     return r.json().get("events", [])
 
@@ -20,7 +22,7 @@ def filter_cinema(events):
     for e in events:
         txt = e.get("text","") or e.get("extract","")
         if not txt: continue
-        if any(k.lower() in txt.lower() for k in KEYWORDS):
+        if KEYWORDS.any(txt):
             year = e.get("year","")
             out.append(f"{year}: {txt}")
     return out
@@ -48,3 +50,4 @@ def main():
 
 if __name__ == "__main__":
     main()
+    raise SystemExit(0 if drain_outbox() else 1)
@@ -0,0 +1,143 @@
+"""
+Потоковый разбор метаданных страницы: og:image, twitter:image, og:video,
+og:description и ссылки на YouTube — за один проход.
+
+Страницу читаем кусками и останавливаемся на </head> (или на MAX_BYTES), если
+всё нужное уже найдено; тело дочитываем только ради того, чего в <head> не было
+(первая <img> как запасная картинка, YouTube-встраивания). Статьи весят
+300 КБ–1 МБ, а нужные теги обычно лежат в первых нескольких КБ.
+"""
+import re, codecs, logging
+from html.parser import HTMLParser
+from typing import Optional, Iterable, Dict
+
+import requests
+
+import http_client
+import metrics
+
+MAX_BYTES = 256 * 1024
+CHUNK = 8192
+_session = http_client.shared()
+
+META_KEYS = {
+    "og:image": "og:image", "og:image:url": "og:image", "og:image:secure_url": "og:image",
+    "twitter:image": "twitter:image", "twitter:image:src": "twitter:image",
+    "og:video": "og:video", "og:video:url": "og:video", "og:video:secure_url": "og:video",
+    "og:description": "og:description",
+}
+yt_rx = re.compile(r"(https?://(?:www\.)?youtu(?:\.be|be\.com)/(?:watch\?v=|embed/|shorts/)?[A-Za-z0-9_\-]{6,})")
+
+
+def normalize_youtube(url: str) -> str:
+    # нормализуем в формат watch?v=
+    for marker in ("/embed/", "/shorts/"):
+        if marker in url:
+            vid = url.split(marker)[1].split("?")[0]
+            return f"https://www.youtube.com/watch?v={vid}"
+    return url
+
+
+class MetaParser(HTMLParser):
+    """Инкрементальный парсер: feed() можно звать кусками по мере загрузки."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.meta: Dict[str, str] = {}
+        self.head_closed = False
+        self._tail = ""  # хвост предыдущего куска — чтобы не порвать YouTube-ссылку
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "meta":
+            a = dict(attrs)
+            key = META_KEYS.get((a.get("property") or a.get("name") or "").lower())
+            if key and a.get("content") and key not in self.meta:
+                self.meta[key] = a["content"].strip()
+        elif tag == "img" and "img" not in self.meta:
+            src = dict(attrs).get("src")
+            if src and not src.startswith("data:"):
+                self.meta["img"] = src
+        elif tag == "body":
+            self.head_closed = True
+
+    def handle_endtag(self, tag):
+        if tag == "head":
+            self.head_closed = True
+
+    def feed_text(self, text: str):
+        with metrics.stage("extract"):
+            if "youtube" not in self.meta:
+                m = yt_rx.search(self._tail + text)
+                if m:
+                    self.meta["youtube"] = normalize_youtube(m.group(1))
+                self._tail = text[-200:]
+            self.feed(text)
+
+    def satisfied(self, need: Iterable[str]) -> bool:
+        if not self.head_closed:
+            return False
+        for n in need:
+            if n == "image" and not image_of(self.meta):
+                return False
+            if n == "youtube" and "youtube" not in self.meta:
+                return False
+        return True
+
+
+def _fix(u: Optional[str]) -> Optional[str]:
+    if u and u.startswith("//"):
+        return "https:" + u
+    return u
+
+
+def image_of(meta: dict) -> Optional[str]:
+    """Лучшая картинка страницы: og:image → twitter:image → первая <img>."""
+    return _fix(meta.get("og:image") or meta.get("twitter:image") or meta.get("img"))
+
+
+def parse_html(text: str) -> dict:
+    """Разбор уже скачанного HTML (строкой)."""
+    p = MetaParser()
+    try:
+        p.feed_text(text)
+    except Exception as e:
+        logging.debug(f"htmlmeta parse: {e}")
+    return p.meta
+
+
+def _encoding(r: requests.Response) -> str:
+    # requests по умолчанию считает text/html latin-1; без явного charset берём utf-8
+    enc = r.encoding if "charset" in r.headers.get("content-type", "").lower() else "utf-8"
+    try:
+        codecs.lookup(enc)
+        return enc
+    except LookupError:
+        return "utf-8"
+
+
+def fetch_meta(url: str, session: Optional[requests.Session] = None, timeout: int = 12,
+               need: Iterable[str] = ("image",), max_bytes: int = MAX_BYTES) -> Optional[dict]:
+    """Качает страницу потоком и останавливается, как только нужное найдено.
+    need: "image" (og/twitter/первая <img>), "youtube". None — страница не открылась."""
+    need = tuple(need)
+    try:
+        r = (session or _session).get(url, timeout=timeout, stream=True)
+    except Exception as e:
+        logging.getLogger("err").info(f"meta fetch fail {url}: {e}")
+        return None
+    try:
+        r.raise_for_status()
+        dec = codecs.getincrementaldecoder(_encoding(r))(errors="replace")
+        p = MetaParser()
+        got = 0
+        for chunk in r.iter_content(CHUNK):
+            got += len(chunk)
+            p.feed_text(dec.decode(chunk))
+            if p.satisfied(need) or got >= max_bytes:
+                break
+        return p.meta
+    except Exception as e:
+        logging.getLogger("err").info(f"meta fetch fail {url}: {e}")
+        return None
+    finally:
+        r.close()
@@ -0,0 +1,148 @@
+"""
+Общий HTTP-клиент для бота и крон-скриптов.
+
+Client — это requests.Session (тот же get/post/stream), но:
+- соединения держатся живыми в пуле (HTTPAdapter, HTTP_POOL_SIZE на хост),
+  так что повторные запросы к одному хосту не платят за TCP+TLS заново;
+- идемпотентные запросы (GET/HEAD) повторяются при сетевых сбоях и ответах
+  429/5xx, до HTTP_RETRIES раз, со случайной экспоненциальной паузой
+  (Retry-After, если сервер его прислал и он разумный); таймауты не
+  повторяются — зависший хост съел бы timeout ещё раз;
+- к одному хосту одновременно идёт не больше HTTP_PER_HOST запросов (для
+  stream=True лимит держится до получения заголовков);
+- на каждый запрос вызываются хуки времени: fn(method, host, status, seconds, error);
+- HTTP_REWRITE_BASE (для bench.py) отправляет все запросы на локальную
+  подмену: https://variety.com/feed/ → {base}/variety.com/feed/.
+
+shared() — клиент с UA бота, browser() — с браузерным UA для зеркал и сайтов,
+которые режут ботов. Оба — по одному на процесс.
+"""
+import os, time, random, logging, threading
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "32"))
+RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.5"))
+PER_HOST = int(os.getenv("HTTP_PER_HOST", "6"))
+TIMEOUT = 15
+RETRY_STATUS = (429, 500, 502, 503, 504)
+MAX_RETRY_AFTER = 30.0
+REWRITE_BASE = os.getenv("HTTP_REWRITE_BASE", "").rstrip("/")
+
+BOT_UA = "UsyPaskalyaBot/1.1"
+BROWSER_UA = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/124.0 Safari/537.36")
+
+Hook = Callable[[str, str, int, float, Optional[BaseException]], None]
+
+
+class Client(requests.Session):
+    def __init__(self, user_agent: str = BOT_UA, pool_size: int = POOL_SIZE, retries: int = RETRIES,
+                 backoff: float = BACKOFF, per_host: int = PER_HOST, timeout: float = TIMEOUT):
+        super().__init__()
+        self.headers.update({"User-Agent": user_agent})
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+        self.retries = retries
+        self.backoff = backoff
+        self.per_host = per_host
+        self.timeout = timeout
+        self.timing_hooks: List[Hook] = []
+        self._hosts: Dict[str, threading.BoundedSemaphore] = {}
+        self._hosts_lock = threading.Lock()
+
+    def add_timing_hook(self, fn: Hook):
+        self.timing_hooks.append(fn)
+
+    def _slot(self, host: str) -> threading.BoundedSemaphore:
+        with self._hosts_lock:
+            sem = self._hosts.get(host)
+            if sem is None:
+                sem = self._hosts[host] = threading.BoundedSemaphore(self.per_host)
+            return sem
+
+    def _emit(self, method: str, host: str, status: int, seconds: float, error: Optional[BaseException]):
+        for fn in self.timing_hooks:
+            try:
+                fn(method, host, status, seconds, error)
+            except Exception as e:
+                logging.debug(f"http hook: {e}")
+
+    def _pause(self, attempt: int, r: Optional[requests.Response]) -> float:
+        ra = r.headers.get("Retry-After", "") if r is not None else ""
+        if ra.isdigit() and int(ra) <= MAX_RETRY_AFTER:
+            return float(ra)
+        return self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+    def request(self, method, url, *args, retries: Optional[int] = None, **kw):
+        method = method.upper()
+        kw.setdefault("timeout", self.timeout)
+        if retries is None:
+            retries = self.retries if method in ("GET", "HEAD") else 0
+        parts = urlsplit(url)
+        host = parts.hostname or ""
+        if REWRITE_BASE and not url.startswith(REWRITE_BASE):
+            url = f"{REWRITE_BASE}/{parts.netloc}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+        sem = self._slot(host)
+        for attempt in range(retries + 1):
+            r, error = None, None
+            t0 = time.perf_counter()
+            with sem:
+                try:
+                    r = super().request(method, url, *args, **kw)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    error = e
+            self._emit(method, host, r.status_code if r is not None else 0, time.perf_counter() - t0, error)
+            # таймаут не повторяем: зависший хост и во второй раз съест весь timeout
+            if error is not None:
+                retry = not isinstance(error, requests.Timeout)
+            else:
+                retry = r.status_code in RETRY_STATUS
+            if retry and attempt < retries:
+                pause = self._pause(attempt, r)
+                if r is not None:
+                    r.close()
+                time.sleep(pause)
+                continue
+            if error is not None:
+                raise error
+            return r
+
+
+_clients: Dict[str, Client] = {}
+_hooks: List[Hook] = []
+_clients_lock = threading.Lock()
+
+
+def _get(name: str, **kw) -> Client:
+    with _clients_lock:
+        c = _clients.get(name)
+        if c is None:
+            c = _clients[name] = Client(**kw)
+            c.timing_hooks.extend(_hooks)
+        return c
+
+
+def shared() -> Client:
+    """Клиент процесса с UA бота: ленты, API, Telegram."""
+    return _get("bot")
+
+
+def browser() -> Client:
+    """Клиент процесса с браузерным UA: статьи, IG-зеркала, Nitter."""
+    c = _get("browser", user_agent=BROWSER_UA)
+    c.headers.setdefault("Accept-Language", "ru,en;q=0.9")
+    return c
+
+
+def add_timing_hook(fn: Hook):
+    """Хук на все клиенты процесса — и уже созданные, и будущие."""
+    with _clients_lock:
+        _hooks.append(fn)
+        for c in _clients.values():
+            c.add_timing_hook(fn)
@@ -0,0 +1,94 @@
+"""
+Локальный кэш свежих кадров из Instagram для рубрики «актриса дня».
+
+Фоновый сборщик заранее находит последний кадр каждого профиля, скачивает его
+и кладёт сюда: URL, подпись и сами байты (.state/ig_cache/). На публикации
+берём уже проверенный кадр с диска — без ожидания сторонних зеркал.
+Кэш ограничен по размеру: при переполнении уходят самые старые кадры.
+"""
+import os, json, time, random, logging, threading
+from typing import Iterable, List, Optional
+
+MAX_BYTES = 200 * 1024 * 1024
+
+
+class IGImageCache:
+    def __init__(self, root: str, max_bytes: int = MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(root, "index.json")
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self.index = {}  # user -> {"img", "cap", "file", "size", "ts", "posted"}
+        if os.path.isfile(self.index_path):
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    self.index = json.load(f)
+            except Exception as e:
+                logging.warning(f"igcache load: {e}")
+        # записи без файла (упали посреди записи) не считаем
+        self.index = {u: e for u, e in self.index.items()
+                      if os.path.isfile(os.path.join(root, e.get("file", "")))}
+
+    def _save(self):
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.index, f, ensure_ascii=False)
+        os.replace(tmp, self.index_path)
+
+    def age(self, user: str) -> float:
+        e = self.index.get(user)
+        return time.time() - e["ts"] if e else float("inf")
+
+    def put(self, user: str, img: str, cap: Optional[str], data: bytes, ext: str = ".jpg"):
+        name = f"{user}{ext}"
+        path = os.path.join(self.root, name)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self.lock:
+            old = self.index.get(user, {})
+            if old.get("file") and old["file"] != name:
+                self._unlink(old["file"])
+            # «когда публиковали» относится к профилю, а не к кадру — не теряем при обновлении
+            self.index[user] = {"img": img, "cap": cap, "file": name, "size": len(data),
+                                "ts": time.time(), "posted": old.get("posted", 0.0)}
+            self._evict()
+            self._save()
+
+    def _unlink(self, name: str):
+        try:
+            os.remove(os.path.join(self.root, name))
+        except OSError:
+            pass
+
+    def _evict(self):
+        total = sum(e["size"] for e in self.index.values())
+        for user, e in sorted(self.index.items(), key=lambda kv: kv[1]["ts"]):
+            if total <= self.max_bytes:
+                break
+            self._unlink(e["file"])
+            total -= e["size"]
+            del self.index[user]
+
+    def pick(self, users: Iterable[str], max_age: float, repost_after: float) -> Optional[str]:
+        """Случайный профиль со свежим кадром, который давно не публиковали."""
+        now = time.time()
+        with self.lock:
+            ok: List[str] = [u for u in users if u in self.index
+                             and now - self.index[u]["ts"] <= max_age
+                             and now - self.index[u]["posted"] >= repost_after]
+        return random.choice(ok) if ok else None
+
+    def get(self, user: str) -> Optional[dict]:
+        """Запись кэша + полный путь к файлу в поле "path"."""
+        with self.lock:
+            e = self.index.get(user)
+            return {**e, "path": os.path.join(self.root, e["file"])} if e else None
+
+    def mark_posted(self, user: str):
+        with self.lock:
+            if user in self.index:
+                self.index[user]["posted"] = time.time()
+                self._save()
@@ -0,0 +1,182 @@
+"""
+Предварительная проверка картинок по первым байтам файла.
+
+probe() читает только начало файла (Range-запрос, а если сервер его не
+понимает — потоком, пока не хватит байтов) и достаёт формат, размеры и длину.
+good() отсеивает то, что Telegram не примет или что выглядит плохо в ленте:
+SVG и прочее не-растровое, трекинг-пиксели и крошечные превью, слишком
+вытянутые полосы, файлы больше MAX_DOWNLOAD. Определённые ответы кэшируются
+по URL (.state/img_probe.json), поэтому одну картинку проверяем один раз;
+таймауты, сетевые сбои и 5xx/429 — нет: такой URL отвергается лишь на
+TRANSIENT_TTL в памяти процесса и потом проверяется заново.
+
+shrink() — для заливки файлом: уменьшает и пережимает большую картинку с
+диска на диск. Нужен Pillow; без него файл просто остаётся как есть.
+"""
+import os, time, struct, logging, threading
+from typing import Dict, Optional
+
+import requests
+
+import http_client
+from kvcache import DiskLRU, MISSING
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow необязателен: без него не уменьшаем, только проверяем
+    Image = None
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+CACHE = DiskLRU(os.path.join(BASE, ".state", "img_probe.json"), max_items=20000,
+                ttl=14 * 86400, neg_ttl=6 * 3600)
+
+HEAD_BYTES = 64 * 1024        # SOF у JPEG бывает после большого EXIF
+MIN_SIDE = 200                # меньше — иконка/пиксель, в ленте смотрится плохо
+MAX_RATIO = 20                # предел Telegram на соотношение сторон
+TG_MAX_SIDES = 10000          # предел Telegram на ширину + высоту
+TG_PHOTO_MAX = 10 * 1024 * 1024
+MAX_DOWNLOAD = 40 * 1024 * 1024  # больше — даже не пытаемся ужимать
+RASTER = ("jpeg", "png", "webp", "gif")
+TRANSIENT_TTL = 300           # сколько не перепроверяем URL после временного сбоя
+
+_transient: Dict[str, float] = {}  # url -> до какого времени считаем недоступным
+_transient_lock = threading.Lock()
+
+
+def _jpeg_size(b: bytes):
+    i = 2
+    while i + 9 < len(b):
+        if b[i] != 0xFF:
+            i += 1
+            continue
+        marker = b[i + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7 or marker == 0xFF:
+            i += 1 if marker == 0xFF else 2
+            continue
+        seg = struct.unpack(">H", b[i + 2:i + 4])[0]
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            h, w = struct.unpack(">HH", b[i + 5:i + 9])
+            return w, h
+        i += 2 + seg
+    return None
+
+
+def sniff(b: bytes):
+    """(формат, ширина, высота) по началу файла; размеры None, если не дочитали."""
+    if b[:8] == b"\x89PNG\r\n\x1a\n" and len(b) >= 24:
+        return ("png",) + struct.unpack(">II", b[16:24])
+    if b[:6] in (b"GIF87a", b"GIF89a") and len(b) >= 10:
+        return ("gif",) + struct.unpack("<HH", b[6:10])
+    if b[:2] == b"\xff\xd8":
+        return ("jpeg",) + (_jpeg_size(b) or (None, None))
+    if b[:4] == b"RIFF" and b[8:12] == b"WEBP" and len(b) >= 30:
+        kind = b[12:16]
+        if kind == b"VP8 ":
+            w, h = struct.unpack("<HH", b[26:30])
+            return "webp", w & 0x3FFF, h & 0x3FFF
+        if kind == b"VP8L":
+            bits = int.from_bytes(b[21:25], "little")
+            return "webp", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if kind == b"VP8X":
+            return "webp", int.from_bytes(b[24:27], "little") + 1, int.from_bytes(b[27:30], "little") + 1
+        return "webp", None, None
+    head = b[:512].lstrip().lower()
+    if head.startswith(b"<svg") or (head.startswith(b"<?xml") and b"<svg" in head):
+        return "svg", None, None
+    if head.startswith((b"<!doctype", b"<html")):
+        return "html", None, None
+    return "unknown", None, None
+
+
+def probe(url: str, session: Optional[requests.Session] = None, timeout: float = 8) -> Optional[dict]:
+    """{"fmt", "w", "h", "size"} по первым HEAD_BYTES; None — временный сбой (сеть, таймаут, 5xx/429).
+    Окончательный отказ сервера (4xx) — fmt="http" со статусом в "status"."""
+    sess = session or http_client.shared()
+    try:
+        with sess.get(url, timeout=timeout, stream=True,
+                      headers={"Range": f"bytes=0-{HEAD_BYTES - 1}"}) as r:
+            r.raise_for_status()
+            size = None
+            cr = r.headers.get("Content-Range", "")
+            if r.status_code == 206 and "/" in cr and cr.rsplit("/", 1)[1].isdigit():
+                size = int(cr.rsplit("/", 1)[1])
+            elif r.status_code == 200 and r.headers.get("Content-Length", "").isdigit():
+                size = int(r.headers["Content-Length"])
+            buf = bytearray()
+            for chunk in r.iter_content(8192):
+                buf += chunk
+                if len(buf) >= HEAD_BYTES:
+                    break
+    except requests.HTTPError as e:
+        logging.info(f"imgprobe {url}: {e}")
+        code = e.response.status_code if e.response is not None else 0
+        if 400 <= code < 500 and code not in (408, 429):
+            return {"fmt": "http", "status": code, "w": None, "h": None, "size": None}
+        return None
+    except Exception as e:
+        logging.info(f"imgprobe {url}: {e}")
+        return None
+    fmt, w, h = sniff(bytes(buf))
+    return {"fmt": fmt, "w": w, "h": h, "size": size}
+
+
+def acceptable(info: Optional[dict]) -> bool:
+    if not info or info["fmt"] not in RASTER:
+        return False
+    w, h = info["w"], info["h"]
+    if w and h:
+        if min(w, h) < MIN_SIDE or max(w, h) > MAX_RATIO * min(w, h):
+            return False
+    if info["size"] and info["size"] > MAX_DOWNLOAD:
+        return False
+    return True
+
+
+def good(url: Optional[str], session: Optional[requests.Session] = None) -> bool:
+    """Годится ли картинка для поста; определённый результат кэшируется по URL."""
+    if not url:
+        return False
+    info = CACHE.get(url)
+    if info is MISSING:
+        now = time.time()
+        with _transient_lock:
+            if _transient.get(url, 0) > now:
+                return False
+            _transient.pop(url, None)
+        info = probe(url, session=session)
+        if info is None:
+            with _transient_lock:
+                if len(_transient) > 5000:
+                    _transient.clear()
+                _transient[url] = now + TRANSIENT_TTL
+            return False
+        # 4xx — окончательный отказ, но картинку могут и вернуть: живёт neg_ttl, как любой None в кэше
+        CACHE.set(url, None if info["fmt"] == "http" else info)
+    return acceptable(info)
+
+
+def needs_shrink(path: str) -> bool:
+    """Файл не пройдёт как фото Telegram: тяжелее TG_PHOTO_MAX или больше по сторонам."""
+    if os.path.getsize(path) > TG_PHOTO_MAX:
+        return True
+    with open(path, "rb") as f:
+        _, w, h = sniff(f.read(HEAD_BYTES))
+    return bool(w and h and w + h > TG_MAX_SIDES)
+
+
+def shrink(path: str, max_side: int = 2560, quality: int = 85) -> Optional[str]:
+    """Уменьшенная JPEG-копия рядом с исходником; None — Pillow нет или не вышло."""
+    if Image is None:
+        return None
+    out = os.path.splitext(path)[0] + ".small.jpg"
+    try:
+        with Image.open(path) as im:
+            # draft() декодирует JPEG сразу в уменьшенном масштабе — без полного кадра в памяти
+            im.draft("RGB", (max_side, max_side))
+            im = im.convert("RGB")
+            im.thumbnail((max_side, max_side))
+            im.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+    except Exception as e:
+        logging.warning(f"imgprobe shrink {path}: {e}")
+        return None
+    return out
@@ -0,0 +1,107 @@
+"""
+Реестр периодических задач, которые раньше жили отдельными cron-сервисами
+(daily_digest, trends, weekly_digest, history_today).
+
+Теперь их запускает планировщик бота (main.py → register()), в том же процессе:
+общий HTTP-клиент, общий клиент LLM, одна загрузка интерпретатора. Модуль
+задачи импортируется только при первом запуске — бот не платит за то, что
+сегодня не понадобится. Время запуска переопределяется переменной
+JOB_<ИМЯ>_AT="HH:MM" (по TZ бота), JOBS_IN_PROCESS=false — вернуть всё cron'у.
+
+    python jobs.py list                 — задачи и расписание
+    python jobs.py run trends           — запустить одну задачу сейчас
+    python jobs.py importtime [модуль]  — что дольше всего импортируется (python -X importtime)
+"""
+import os, sys, time, logging, importlib, subprocess
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+
+
+class JobSpec(NamedTuple):
+    module: str
+    hour: int
+    minute: int
+    weekday: Optional[int] = None  # 0 — понедельник
+
+
+JOBS: Dict[str, JobSpec] = {
+    "history_today": JobSpec("history_today", 9, 0),
+    "weekly_digest": JobSpec("weekly_digest", 17, 0, weekday=6),
+    "trends": JobSpec("trends", 18, 0),
+    "daily_digest": JobSpec("daily_digest", 19, 0),
+}
+
+
+def schedule_of(name: str) -> Tuple[int, int, Optional[int]]:
+    spec = JOBS[name]
+    at = os.getenv(f"JOB_{name.upper()}_AT", "")
+    if at:
+        try:
+            h, m = (int(x) for x in at.split(":"))
+            return h, m, spec.weekday
+        except ValueError:
+            logging.warning(f"jobs: непонятное JOB_{name.upper()}_AT={at!r}, оставляем по умолчанию")
+    return spec.hour, spec.minute, spec.weekday
+
+
+def run(name: str) -> bool:
+    """Импортирует модуль задачи (один раз) и вызывает его main()."""
+    t0 = time.time()
+    try:
+        mod = importlib.import_module(JOBS[name].module)
+        mod.main()
+    except Exception as e:
+        logging.getLogger("err").error(f"job {name}: {e}")
+        return False
+    logging.info(f"job {name}: готово за {time.time() - t0:.1f} c")
+    return True
+
+
+def register(scheduler) -> List[str]:
+    """Ставит все задачи в планировщик бота (scheduler.Scheduler.daily)."""
+    if os.getenv("JOBS_IN_PROCESS", "true").lower() != "true":  # читаем здесь: .env мог загрузиться после импорта
+        return []
+    for name in JOBS:
+        h, m, wd = schedule_of(name)
+        scheduler.daily(f"job_{name}", h, m, lambda n=name: run(n), weekday=wd)
+    return list(JOBS)
+
+
+def importtime(module: str = "main", top: int = 15) -> str:
+    """Отчёт python -X importtime по модулю: самые дорогие импорты по суммарному времени."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=BASE, capture_output=True, text=True, env={**os.environ, "JOBS_IN_PROCESS": "false"})
+    rows = []  # (суммарно мкс, свои мкс, имя с отступом вложенности)
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        parts = line.split(":", 1)[1].split("|")
+        try:
+            rows.append((int(parts[1]), int(parts[0]), parts[2].rstrip()))
+        except (IndexError, ValueError):
+            continue
+    if not rows:
+        return f"importtime {module}: нет данных\n{proc.stderr[-400:]}"
+    total = sum(cum for cum, _, name in rows if not name.startswith("  "))  # только верхний уровень
+    out = [f"import {module}: {total / 1000:.0f} мс всего"]
+    for cum, own, name in sorted(rows, reverse=True)[:top]:
+        out.append(f"{cum / 1000:8.1f} мс  {own / 1000:7.1f} мс свои  {name.strip()}")
+    return "\n".join(out)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "list"
+    if cmd == "run" and len(sys.argv) > 2 and sys.argv[2] in JOBS:
+        ok = run(sys.argv[2])
+        import outbox, common  # допослать поставленное в очередь перед выходом
+        if common.TELEGRAM_BOT_TOKEN:
+            outbox.default(common.TELEGRAM_BOT_TOKEN).flush(60)
+        sys.exit(0 if ok else 1)
+    elif cmd == "importtime":
+        print(importtime(sys.argv[2] if len(sys.argv) > 2 else "main"))
+    else:
+        for name in JOBS:
+            h, m, wd = schedule_of(name)
+            print(f"{name:15s} {h:02d}:{m:02d}" + (f" (день недели {wd})" if wd is not None else ""))
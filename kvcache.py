@@ -0,0 +1,88 @@
+"""
+Небольшой дисковый LRU-кэш с TTL (JSON в .state/).
+
+Хранит и «отрицательные» результаты (значение None) — со своим, более коротким
+TTL, чтобы страницы без картинки не качались каждый проход. Считает попадания и
+промахи. Пишется на диск целиком и атомарно, только если что-то поменялось.
+"""
+import os, json, time, logging, threading
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+MISSING = object()
+
+
+class DiskLRU:
+    def __init__(self, path: str, max_items: int = 5000, ttl: float = 7 * 86400,
+                 neg_ttl: float = 6 * 3600):
+        self.path = path
+        self.max_items = max_items
+        self.ttl = ttl
+        self.neg_ttl = neg_ttl
+        self.lock = threading.Lock()
+        self.data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()  # key -> (expires, value)
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        self._load()
+
+    def _load(self):
+        if not os.path.isfile(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                now = time.time()
+                for k, (exp, v) in json.load(f):
+                    if exp > now:
+                        self.data[k] = (exp, v)
+        except Exception as e:
+            logging.warning(f"kvcache load {self.path}: {e}")
+
+    def get(self, key: str, default=MISSING):
+        """Значение по ключу (None — закэшированный «нет результата»); default — если ключа нет."""
+        with self.lock:
+            rec = self.data.get(key)
+            if rec is None or rec[0] <= time.time():
+                if rec is not None:
+                    del self.data[key]
+                    self.dirty = True
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            self.hits += 1
+            return rec[1]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        if ttl is None:
+            ttl = self.ttl if value is not None else self.neg_ttl
+        with self.lock:
+            self.data[key] = (time.time() + ttl, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.max_items:
+                self.data.popitem(last=False)
+            self.dirty = True
+
+    def pop(self, key: str):
+        with self.lock:
+            if self.data.pop(key, None) is not None:
+                self.dirty = True
+
+    def stats(self) -> dict:
+        with self.lock:
+            total = self.hits + self.misses
+            return {"items": len(self.data), "hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / total, 3) if total else 0.0}
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            rows = [[k, list(rec)] for k, rec in self.data.items()]
+            self.dirty = False
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(rows, f)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            logging.warning(f"kvcache save {self.path}: {e}")
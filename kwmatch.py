@@ -0,0 +1,102 @@
+"""
+Скомпилированный многошаблонный поиск ключевых слов (keywords.yaml).
+
+Все слова группы сворачиваются в префиксное дерево, а дерево — в одно регулярное
+выражение с границами слов: текст сканируется один раз, сколько бы слов ни было
+в списке, а «dc» больше не находится внутри случайных слов. score_many() оценивает
+пачку текстов одним проходом регулярки.
+"""
+import os, re, logging
+from bisect import bisect_right
+from typing import Dict, List, Iterable, Set, Tuple
+
+KEYWORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "keywords.yaml")
+SEP = "\n\x00\n"  # разделитель текстов в пачке: не буква, фраза через него не склеится
+
+
+def load_groups(path: str = KEYWORDS_PATH) -> Dict[str, Tuple[float, List[str]]]:
+    import yaml  # только когда словарь и правда читают
+    with open(path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f) or {}
+    return {name: (float(g.get("weight", 1)), [str(w) for w in g.get("words", [])])
+            for name, g in data.items()}
+
+
+def _trie_regex(node: dict) -> str:
+    # ключ "" в узле — конец слова: "exact" или "wild" (дальше любые буквы)
+    end = node.get("")
+    alts = [re.escape(ch) + _trie_regex(child) for ch, child in sorted(node.items()) if ch]
+    if not alts:
+        return r"\w*" if end == "wild" else ""
+    body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+    if end == "wild":
+        return "(?:" + body + r"|\w*)"
+    if end == "exact":
+        return "(?:" + body + ")?"
+    return body
+
+
+class KeywordMatcher:
+    def __init__(self, words: Dict[str, float]):
+        """words: слово (можно с «*» на конце) → вес."""
+        self.exact: Dict[str, float] = {}
+        self.stems: Dict[str, float] = {}
+        trie: dict = {}
+        for w, weight in words.items():
+            wild = w.endswith("*")
+            key = w.rstrip("*").strip().lower()
+            if not key:
+                continue
+            (self.stems if wild else self.exact)[key] = \
+                (self.stems if wild else self.exact).get(key, 0.0) + weight
+            node = trie
+            for ch in key:
+                node = node.setdefault(ch, {})
+            if node.get("") != "wild":
+                node[""] = "wild" if wild else "exact"
+        self.max_stem = max((len(s) for s in self.stems), default=0)
+        body = _trie_regex(trie) if trie else r"(?!x)x"
+        self.rx = re.compile(r"(?<!\w)" + body + r"(?!\w)", re.I)
+
+    def _weight(self, found: str) -> float:
+        w = self.exact.get(found, 0.0)
+        # совпадение по шаблону «основа*»: ищем самую длинную подходящую основу
+        for n in range(min(len(found), self.max_stem), 0, -1):
+            if found[:n] in self.stems:
+                return w + self.stems[found[:n]]
+        return w
+
+    def matches(self, text: str) -> Set[str]:
+        return {m.group(0).lower() for m in self.rx.finditer(text or "")}
+
+    def any(self, text: str) -> bool:
+        return self.rx.search(text or "") is not None
+
+    def score(self, text: str) -> float:
+        return sum(self._weight(f) for f in self.matches(text))
+
+    def score_many(self, texts: Iterable[str]) -> List[float]:
+        """Оценки для пачки текстов за один проход регулярки."""
+        texts = [t or "" for t in texts]
+        starts, pos = [], 0
+        for t in texts:
+            starts.append(pos)
+            pos += len(t) + len(SEP)
+        found: List[Set[str]] = [set() for _ in texts]
+        for m in self.rx.finditer(SEP.join(texts)):
+            found[bisect_right(starts, m.start()) - 1].add(m.group(0).lower())
+        return [sum(self._weight(f) for f in fs) for fs in found]
+
+
+def matcher(*names: str, path: str = KEYWORDS_PATH) -> KeywordMatcher:
+    """Матчер по группам из keywords.yaml; веса слов из разных групп складываются."""
+    groups = load_groups(path)
+    words: Dict[str, float] = {}
+    for name in names:
+        if name not in groups:
+            logging.warning(f"kwmatch: нет группы {name} в {path}")
+            continue
+        weight, ws = groups[name]
+        for w in ws:
+            words[w] = words.get(w, 0.0) + weight
+    return KeywordMatcher(words)
@@ -0,0 +1,199 @@
+"""
+Слой над OpenAI: один клиент на процесс, кэш ответов и учёт токенов.
+
+- Клиент создаётся один раз (OPENAI_BASE_URL — можно направить на локальную
+  замену с тем же API, например для bench/тестов). Повторы на 429/5xx и сетевые
+  сбои — только здесь (RETRIES, с паузой по retry-after); у SDK свои выключены
+  (max_retries=0), чтобы слои повторов не перемножались.
+- Ответы кэшируются в .state/llm_cache.sqlite по хэшу (модель, system, prompt,
+  temperature, max_tokens, scope) с TTL: перезапуск weekly_digest после неудачной
+  отправки не платит второй раз. scope — контекст, без которого одинаковый
+  промпт должен давать новый ответ (дата для контента по расписанию).
+- stats(): вызовы, попадания в кэш, токены, суммарная и максимальная задержка.
+- submit() — тот же запрос в фоновом потоке (Future), вызывающий не ждёт.
+- batch() — несколько коротких саммари одним запросом (JSON-массив в ответе);
+  если модель ответила не тем числом пунктов — добираем по одному.
+"""
+import os, json, time, random, sqlite3, hashlib, logging, threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Sequence
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.path.join(BASE, ".state", "llm_cache.sqlite")
+MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+CACHE_TTL = float(os.getenv("LLM_CACHE_TTL_H", "72")) * 3600
+TIMEOUT = 30
+RETRIES = 3
+BACKOFF = 1.0
+MAX_RETRY_AFTER = 60.0
+
+
+class LLM:
+    def __init__(self, api_key: str, base_url: Optional[str] = None, cache_path: str = CACHE_PATH,
+                 ttl: float = CACHE_TTL, retries: int = RETRIES, workers: int = 4):
+        self.api_key = api_key
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL") or None
+        self.ttl = ttl
+        self.retries = retries
+        self._client = None
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm")
+        self.counters = {"calls": 0, "cache_hits": 0, "errors": 0, "prompt_tokens": 0,
+                         "completion_tokens": 0, "latency_sum": 0.0, "latency_max": 0.0}
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        self.db = sqlite3.connect(cache_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS llm_cache ("
+                        "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, expires REAL NOT NULL)")
+        with self.lock:
+            self.db.execute("DELETE FROM llm_cache WHERE expires<?", (time.time(),))
+
+    @property
+    def client(self):
+        if self._client is None:
+            from openai import OpenAI  # тяжёлый импорт — только когда реально нужен
+            self._client = OpenAI(api_key=self.api_key, base_url=self.base_url,
+                                  max_retries=0, timeout=TIMEOUT)  # повторяет _call
+        return self._client
+
+    # ---------- кэш ----------
+    @staticmethod
+    def _key(model: str, system: str, prompt: str, temperature: float, max_tokens: int, scope: str = "") -> str:
+        raw = json.dumps([model, system, prompt, temperature, max_tokens] + ([scope] if scope else []),
+                         ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _cached(self, key: str) -> Optional[str]:
+        with self.lock:
+            row = self.db.execute("SELECT value FROM llm_cache WHERE key=? AND expires>?",
+                                  (key, time.time())).fetchone()
+            if row:
+                self.counters["cache_hits"] += 1
+        return row[0] if row else None
+
+    def _store(self, key: str, value: str, ttl: Optional[float]):
+        now = time.time()
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO llm_cache(key, value, created, expires) VALUES (?,?,?,?)",
+                            (key, value, now, now + (self.ttl if ttl is None else ttl)))
+
+    # ---------- вызовы ----------
+    @staticmethod
+    def _pause(e: Exception, attempt: int) -> Optional[float]:
+        """Пауза перед повтором; None — ошибку повторять бесполезно (400, 401, …)."""
+        from openai import APIConnectionError, APIStatusError  # уже импортирован вместе с клиентом
+        if isinstance(e, APIStatusError):
+            if e.status_code != 429 and e.status_code < 500:
+                return None
+            ra = e.response.headers.get("retry-after", "")
+        elif isinstance(e, APIConnectionError):  # и APITimeoutError
+            ra = ""
+        else:
+            return None
+        try:
+            if ra and float(ra) <= MAX_RETRY_AFTER:
+                return float(ra)
+        except ValueError:
+            pass
+        return BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+    def _call(self, messages: list, model: str, temperature: float, max_tokens: int, **kw) -> str:
+        client = self.client  # создание клиента не считаем в задержку запроса
+        t0 = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            try:
+                resp = client.chat.completions.create(model=model, messages=messages, temperature=temperature,
+                                                      max_tokens=max_tokens, **kw)
+                break
+            except Exception as e:
+                pause = self._pause(e, attempt) if attempt < self.retries else None
+                if pause is None:
+                    with self.lock:
+                        self.counters["errors"] += 1
+                    raise
+                time.sleep(pause)
+        dt = time.perf_counter() - t0
+        with self.lock:
+            c = self.counters
+            c["calls"] += 1
+            c["latency_sum"] += dt
+            c["latency_max"] = max(c["latency_max"], dt)
+            if resp.usage:
+                c["prompt_tokens"] += resp.usage.prompt_tokens or 0
+                c["completion_tokens"] += resp.usage.completion_tokens or 0
+        return (resp.choices[0].message.content or "").strip()
+
+    def complete(self, prompt: str, system: str = "", model: str = MODEL, temperature: float = 0.2,
+                 max_tokens: int = 220, ttl: Optional[float] = None, scope: str = "") -> Optional[str]:
+        """Ответ модели (из кэша, если такой запрос с тем же scope уже был); None — ключа нет или ошибка."""
+        if not self.api_key:
+            return None
+        key = self._key(model, system, prompt, temperature, max_tokens, scope)
+        hit = self._cached(key)
+        if hit is not None:
+            return hit
+        messages = ([{"role": "system", "content": system}] if system else []) + [{"role": "user", "content": prompt}]
+        try:
+            text = self._call(messages, model, temperature, max_tokens)
+        except Exception as e:
+            logging.warning(f"LLM failed: {e}")
+            return None
+        if text:
+            self._store(key, text, ttl)
+        return text or None
+
+    def submit(self, prompt: str, **kw) -> "Future[Optional[str]]":
+        """complete() в фоне: запросы идут параллельно, вызывающий забирает .result() когда нужно."""
+        return self.pool.submit(self.complete, prompt, **kw)
+
+    def batch(self, prompts: Sequence[str], system: str = "", model: str = MODEL, temperature: float = 0.2,
+              max_tokens: int = 220, ttl: Optional[float] = None) -> List[Optional[str]]:
+        """Несколько саммари одним запросом; max_tokens — на один пункт."""
+        if not self.api_key:
+            return [None] * len(prompts)
+        keys = [self._key(model, system, p, temperature, max_tokens) for p in prompts]
+        out: List[Optional[str]] = [self._cached(k) for k in keys]
+        todo = [i for i, v in enumerate(out) if v is None]
+        if len(todo) > 1:
+            numbered = "\n\n".join(f"### {n}\n{prompts[i]}" for n, i in enumerate(todo, 1))
+            ask = (f"Ниже {len(todo)} независимых заданий. Выполни каждое отдельно и верни JSON "
+                   f'{{"items": [...]}} — массив из {len(todo)} строк-ответов в том же порядке.\n\n{numbered}')
+            messages = ([{"role": "system", "content": system}] if system else []) + [{"role": "user", "content": ask}]
+            try:
+                raw = self._call(messages, model, temperature, max_tokens * len(todo) + 50,
+                                 response_format={"type": "json_object"})
+                items = json.loads(raw).get("items")
+                if isinstance(items, list) and len(items) == len(todo):
+                    for i, text in zip(todo, items):
+                        text = str(text).strip()
+                        if text:
+                            out[i] = text
+                            self._store(keys[i], text, ttl)
+            except Exception as e:
+                logging.warning(f"LLM batch failed, по одному: {e}")
+        # что не вышло пачкой — параллельно по одному
+        rest = {i: self.submit(prompts[i], system=system, model=model, temperature=temperature,
+                               max_tokens=max_tokens, ttl=ttl) for i, v in enumerate(out) if v is None}
+        for i, f in rest.items():
+            out[i] = f.result()
+        return out
+
+    def stats(self) -> dict:
+        with self.lock:
+            c = dict(self.counters)
+        c["latency_avg"] = round(c["latency_sum"] / c["calls"], 3) if c["calls"] else 0.0
+        return c
+
+
+_default: Optional[LLM] = None
+_default_lock = threading.Lock()
+
+
+def default(api_key: str) -> LLM:
+    """Общий экземпляр процесса."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = LLM(api_key)
+        return _default
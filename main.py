@@ -17,18 +17,13 @@
 """
 
 from __future__ import annotations
-import os, sys, re, io, json, time, random, logging, textwrap, html, mimetypes, hashlib
-import datetime as dt
+import os, sys, re, time, random, logging, textwrap, html, mimetypes, hashlib
+import datetime as dt, threading, heapq, calendar
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from typing import Optional, List, Dict, Tuple
 from dataclasses import dataclass, field
 
-import requests
-try:
-    import feedparser
-except ImportError:
-    os.system("pip install feedparser")
-    import feedparser
-
 # ---------- базовая настройка ----------
 BASE = os.path.dirname(os.path.abspath(__file__))
 os.makedirs(os.path.join(BASE, "logs"), exist_ok=True)
@@ -48,6 +43,30 @@ def load_env():
     return env
 ENV = load_env()
 def E(key, default=""): return os.getenv(key, ENV.get(key, default))
+# модули ниже (jobs, metrics, outbox, http_client, llm, archive, задачи common.py) читают
+# настройки из окружения при импорте — поэтому .env попадает туда до их импорта
+for _k,_v in ENV.items(): os.environ.setdefault(_k, _v)
+
+import requests
+from feedcache import fetch_feed
+from mirrors import MirrorHealth
+from sources import NITTER_MIRRORS, NITTER_HEALTH, Registry, nitter_url, key_for
+from pollsched import PollSchedule
+from igcache import IGImageCache
+from kvcache import DiskLRU, MISSING
+import htmlmeta
+import http_client
+import imgprobe
+from seenstore import SeenStore
+import kwmatch
+from clusters import StoryIndex, band_keys
+from scheduler import Scheduler
+from archive import Archive
+import jobs
+import outbox
+import metrics
+import feedcache
+import llm
 
 TELEGRAM_BOT_TOKEN = E("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHANNEL_ID = E("TELEGRAM_CHANNEL_ID")
@@ -56,6 +75,26 @@ TMDB_API_KEY = E("TMDB_API_KEY","")
 TZ = E("TZ","Europe/Amsterdam")
 NEWS_INTERVAL_MIN = int(E("NEWS_INTERVAL_MIN","15"))
 COLLECT_WINDOW_MIN = int(E("COLLECT_WINDOW_MIN","15"))
+SEEN_TTL_DAYS = int(E("SEEN_TTL_DAYS","30"))
+STORY_TTL_DAYS = int(E("STORY_TTL_DAYS","3"))  # сколько помним опубликованный сюжет
+FETCH_WORKERS = int(E("FETCH_WORKERS","24"))          # общий пул потоков сбора
+PER_HOST_LIMIT = int(E("PER_HOST_LIMIT","2"))         # не больше N запросов к одному хосту
+CYCLE_DEADLINE_SEC = int(E("CYCLE_DEADLINE_SEC","45")) # жёсткий дедлайн одного прохода
+CYCLE_PAUSE_SEC = int(E("CYCLE_PAUSE_SEC","20"))
+POOL_TOP_K = int(E("POOL_TOP_K","50"))               # сколько лучших кандидатов держим в окне
+# сколько неопубликованный сюжет живёт в пуле сервиса: ленты отдают запись один раз (HWM),
+# так что окна COLLECT_WINDOW_MIN мало — в тихие часы пул бы пустел
+POOL_KEEP_MIN = int(E("POOL_KEEP_MIN","360"))
+# сколько источников реестра (rss_sources.yaml) добавлять к «ядру» за проход, по видам
+SHARD_RSS = int(E("SHARD_RSS","40"))
+SHARD_X = int(E("SHARD_X","40"))
+SHARD_IG = int(E("SHARD_IG","4"))
+POLL_MAX_SEC = int(E("POLL_MAX_SEC","3600"))         # самый редкий опрос «спящего» источника
+IG_HEDGE_SEC = float(E("IG_HEDGE_SEC","1.5"))         # через сколько подключать следующее IG-зеркало
+IG_DEADLINE_SEC = float(E("IG_DEADLINE_SEC","20"))    # общий предел на поиск кадра
+IG_REFRESH_HOURS = int(E("IG_REFRESH_HOURS","12"))    # как часто обновлять кадр профиля в кэше
+IG_PREFETCH_PAUSE = int(E("IG_PREFETCH_PAUSE","20"))  # пауза между профилями у фонового сборщика
+IG_REPOST_DAYS = int(E("IG_REPOST_DAYS","7"))         # не повторять актрису чаще
 
 os.environ["TZ"]=TZ
 try:
@@ -74,40 +113,33 @@ logging.basicConfig(
 err = logging.getLogger("err")
 err.addHandler(logging.FileHandler(os.path.join(BASE,"logs","error.log"), encoding="utf-8"))
 
-UA = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-      "(KHTML, like Gecko) Chrome/124.0 Safari/537.36")
-S = requests.Session()
-S.headers.update({"User-Agent": UA, "Accept-Language":"ru,en;q=0.9"})
+# общий пул соединений с повторами и лимитом на хост (http_client.py), браузерный UA
+S = http_client.browser()
+metrics.install()  # задержка/статусы/ошибки по хосту со всех HTTP-клиентов процесса
 
 # ---------- анти-дубли ----------
-SEEN_PATH = os.path.join(BASE, ".state", "seen.json")
-def load_seen()->Dict[str,float]:
-    if os.path.isfile(SEEN_PATH):
-        try: return json.load(open(SEEN_PATH,"r",encoding="utf-8"))
-        except Exception: return {}
-    return {}
-def save_seen(d:Dict[str,float]):
-    try: json.dump(d, open(SEEN_PATH,"w",encoding="utf-8"))
-    except Exception as e: err.error(f"save_seen: {e}")
-SEEN = load_seen()
+# SQLite с истечением ключей; старый seen.json переносится при первом запуске
+SEEN = SeenStore(os.path.join(BASE, ".state", "seen.sqlite"),
+                 legacy_json=os.path.join(BASE, ".state", "seen.json"),
+                 default_ttl=SEEN_TTL_DAYS*86400)
 
 def h(s:str)->str: return hashlib.sha1(s.encode("utf-8","ignore")).hexdigest()
 def now()->dt.datetime: return dt.datetime.now()
 
 # ---------- Telegram ----------
-def tg_api(method:str, data=None, files=None)->bool:
+def tg_api(method:str, data:dict, file:Optional[str]=None)->bool:
+    """Ставит вызов в исходящую очередь и сразу возвращается: повторы, 429 и
+    перезаливку фото делает отправитель outbox. False — только если поставить не удалось."""
     if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHANNEL_ID:
         err.error("TELEGRAM_* не заданы")
         return False
-    url=f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/{method}"
     try:
-        r=S.post(url, data=data, files=files, timeout=25)
-        ok=r.ok and r.json().get("ok",False)
-        if not ok:
-            err.error(f"TG {method} failed: {r.text[:400]}")
-        return ok
+        outbox.default(TELEGRAM_BOT_TOKEN).enqueue(method, data, file=file)
+        metrics.inc("tg_enqueued_total", method=method)
+        return True
     except Exception as e:
-        err.error(f"TG {method} ex: {e}")
+        metrics.inc("tg_enqueue_errors_total", method=method)
+        err.error(f"TG {method} enqueue: {e}")
         return False
 
 def tg_send_text(text:str)->bool:
@@ -118,31 +150,22 @@ def tg_send_text(text:str)->bool:
         "disable_web_page_preview": True
     })
 
+def tg_send_photo_file(path:str, caption:str)->bool:
+    """Фото с диска (кадр из IG_CACHE) — сразу файлом."""
+    return tg_api("sendPhoto",{
+        "chat_id": TELEGRAM_CHANNEL_ID,
+        "caption": caption,
+        "parse_mode":"HTML"
+    }, file=path)
+
 def tg_send_photo(photo_url:str, caption:str)->bool:
-    """Сначала пробуем URL; если TG не может скачать — перезаливаем как файл."""
-    # 1) как URL
-    ok = tg_api("sendPhoto",{
+    """По URL; если TG не сможет скачать — outbox сам перезальёт файлом."""
+    return tg_api("sendPhoto",{
         "chat_id": TELEGRAM_CHANNEL_ID,
         "photo": photo_url,
         "caption": caption,
         "parse_mode":"HTML"
     })
-    if ok: return True
-    # 2) качаем и заливаем
-    try:
-        r=S.get(photo_url, timeout=30)
-        r.raise_for_status()
-        mime = r.headers.get("content-type") or mimetypes.guess_type(photo_url)[0] or "image/jpeg"
-        ext = mimetypes.guess_extension(mime) or ".jpg"
-        files={"photo": (f"photo{ext}", io.BytesIO(r.content), mime)}
-        return tg_api("sendPhoto",{
-            "chat_id": TELEGRAM_CHANNEL_ID,
-            "caption": caption,
-            "parse_mode":"HTML"
-        }, files=files)
-    except Exception as e:
-        err.error(f"photo reupload fail: {e}")
-        return False
 
 # ---------- утилиты контента ----------
 def clamp(s:str, n:int)->str:
@@ -156,34 +179,33 @@ def host(u:str)->str:
         return "src"
 
 def fetch(url:str, **kw)->Optional[requests.Response]:
+    t0=time.perf_counter(); r=None
     try:
         r=S.get(url, timeout=15, **kw)
         r.raise_for_status()
+        metrics.fetched(metrics.source_of(url), time.perf_counter()-t0, r)
         return r
     except Exception as e:
+        metrics.fetched(metrics.source_of(url), time.perf_counter()-t0, r, error=e)
         err.info(f"fetch fail {url}: {e}")
         return None
 
-def extract_image(html_text:str)->Optional[str]:
-    for pat in [
-        r'property=["\']og:image["\'][^>]+content=["\']([^"\']+)["\']',
-        r'name=["\']twitter:image["\'][^>]+content=["\']([^"\']+)["\']',
-        r'<img[^>]+src=["\']([^"\']+)["\']'
-    ]:
-        m=re.search(pat, html_text, re.I)
-        if m:
-            img=m.group(1)
-            if img.startswith("//"): img="https:"+img
-            return img
-    return None
+# кэш «ссылка на статью → og:image» (в т.ч. «картинки нет»), чтобы не качать
+# одну и ту же страницу на каждом проходе окна
+OG_CACHE = DiskLRU(os.path.join(BASE, ".state", "og_cache.json"), max_items=int(E("OG_CACHE_MAX","5000")))
+def article_image(link:str)->Optional[str]:
+    img=OG_CACHE.get(link)
+    if img is not MISSING: return img
+    meta=htmlmeta.fetch_meta(link, session=S, timeout=15)  # читаем только <head>
+    if meta is None:
+        OG_CACHE.set(link, None, ttl=600)  # сетевой сбой — короткая пауза, не полсуток
+        return None
+    img=htmlmeta.image_of(meta)
+    OG_CACHE.set(link, img)
+    return img
 
 # ---------- источники ----------
-NITTER_MIRRORS = [
-    "https://nitter.net",
-    "https://nitter.poast.org",
-    "https://nitter.fdn.fr",
-    "https://nitter.lacontrevoie.fr",
-]
+# зеркала Nitter и их здоровье — в sources.py (общие с weekly_digest)
 # ключевые X-аккаунты (минимальный набор; можно расширять файлом)
 X_HANDLES = [
     "Variety","THR","DEADLINE","IndieWire","TheWrap","empiremagazine",
@@ -193,13 +215,19 @@ X_HANDLES = [
     "Blumhouse","FocusFeatures","searchlightpics","warnerbros","UniversalPics",
     "SonyPictures","ParamountPics","Lionsgate","MarvelStudios","starwars"
 ]
-# создаём RSS url для каждого зеркала; бот сам попробует рабочее
-def nitter_rss_urls()->List[str]:
-    urls=[]
-    for h in X_HANDLES:
-        for base in NITTER_MIRRORS:
-            urls.append(f"{base}/{h}/rss")
-    return urls
+
+# по одному RSS url на хэндл: зеркало выбирает NITTER_HEALTH (закреплённое за хэндлом
+# или самое быстрое живое); хэндлы, для которых все зеркала на паузе, ждут следующего прохода
+def nitter_rss_urls(handles:Optional[List[str]]=None)->List[str]:
+    return [u for u in map(nitter_url, X_HANDLES if handles is None else handles) if u]
+
+def is_nitter(u:str)->bool:
+    return any(u.startswith(base+"/") for base in NITTER_MIRRORS)
+
+def split_nitter(u:str)->Tuple[str,str]:
+    """(зеркало, хэндл) из nitter RSS url."""
+    base=next(b for b in NITTER_MIRRORS if u.startswith(b+"/"))
+    return base, u[len(base)+1:].split("/",1)[0]
 
 # IG-зеркала и r.jina.ai (прокси)
 IG_MIRRORS = [
@@ -248,67 +276,168 @@ class NewsItem:
     likes: int = 0
     shares: int = 0
     score: float = 0.0
+    sources: int = 1                   # сколько источников пишут о том же сюжете
+    published: float = 0.0             # время записи в ленте (0 — лента его не дала)
+    bands: Tuple[str,...] = ()         # ключи LSH-полос сюжета (clusters.band_keys)
+
+# ---------- расписание опроса ----------
+# интервал каждого источника подстраивается под то, как часто в нём появляется новое
+POLL = PollSchedule(os.path.join(BASE, ".state", "poll_intervals.json"),
+                    min_interval=CYCLE_PAUSE_SEC, max_interval=POLL_MAX_SEC)
+
+def entry_ts(e)->float:
+    t=e.get("published_parsed") or e.get("updated_parsed")
+    return float(calendar.timegm(t)) if t else 0.0
+
+def learn(key:str, entries)->None:
+    """Отчитаться расписанию: самая свежая запись ленты (или первая ссылка, если дат нет)."""
+    if not entries:
+        POLL.observe(key, None, ok=False)
+        return
+    newest=max(entry_ts(e) for e in entries)
+    POLL.observe(key, newest or entries[0].get("link") or None)
+
+# ---------- уже обработанные записи ----------
+class HighWater:
+    """По каждой ленте помним id уже разобранных записей и самую свежую дату, чтобы
+    известные записи отсеивать до любой работы (разбор, поиск картинки, NewsItem).
+    Живёт в памяти процесса: после рестарта один проход сделает всё заново,
+    а страницы статей при этом отдаст OG_CACHE."""
+    KEEP=300        # сколько id помнить на ленту
+    SLACK=86400     # записи старше «самой свежей» на сутки — точно не новости
+
+    def __init__(self):
+        self.lock=threading.Lock()
+        self.feeds:Dict[str,Tuple[float,Dict[str,None]]]={}  # key -> (max ts, упорядоченный набор id)
+
+    def fresh(self, key:str, entries, limit:int=5)->list:
+        """Новые записи (не больше limit, в порядке ленты); они же сразу помечаются известными.
+        При первом знакомстве с лентой всё сверх limit считается старым."""
+        with self.lock:
+            first=key not in self.feeds
+            top,ids=self.feeds.get(key, (0.0, {}))
+            new=[]
+            for e in entries:
+                eid=e.get("id") or e.get("link") or e.get("title") or ""
+                if eid in ids: continue
+                ts=entry_ts(e)
+                if ts and ts < top-self.SLACK: continue
+                if len(new)<limit: new.append(e)
+                elif not first: continue  # не влезло — разберём в следующий проход
+                ids[eid]=None
+                top=max(top, ts)
+            while len(ids)>self.KEEP:
+                del ids[next(iter(ids))]
+            self.feeds[key]=(top, ids)
+            return new
+
+HWM = HighWater()
 
 # ---------- сбор из RSS ----------
 def parse_rss(url:str)->List[NewsItem]:
     out=[]
     try:
-        feed=feedparser.parse(url)
-        for e in feed.entries:
-            title=html.unescape(e.get("title","")).strip()
-            summary=html.unescape(re.sub("<[^>]+>","", e.get("summary",""))).strip()
-            link=e.get("link","")
-            img=None
-            # media
-            for key in ("media_content","media_thumbnail"):
-                arr=e.get(key)
-                if arr and isinstance(arr,list):
-                    u=arr[0].get("url")
-                    if u: img=u; break
+        feed,_=fetch_feed(url, session=S, retries=0)  # условный GET; на 304 — лента из кэша; повтор — следующий проход
+        learn(url, feed.entries if feed else None)
+        if not feed: return out
+        for e in HWM.fresh(url, feed.entries):
+            with metrics.stage("extract"):
+                title=html.unescape(e.get("title","")).strip()
+                summary=html.unescape(re.sub("<[^>]+>","", e.get("summary",""))).strip()
+                link=e.get("link","")
+                img=None
+                # media
+                for key in ("media_content","media_thumbnail"):
+                    arr=e.get(key)
+                    if arr and isinstance(arr,list):
+                        u=arr[0].get("url")
+                        if u: img=u; break
+            # пиксели, SVG и превью 100×100 отсеиваем по первым байтам, а не после провала sendPhoto
+            if img and not imgprobe.good(img, session=S): img=None
             if not img and link:
-                r=fetch(link)
-                if r:
-                    img=extract_image(r.text)
+                img=article_image(link)
+                if img and not imgprobe.good(img, session=S): img=None
             if title and link:
-                out.append(NewsItem(title, summary, link, img, url))
+                out.append(NewsItem(title, summary, link, img, url, published=entry_ts(e)))
     except Exception as e:
         err.info(f"parse_rss {url}: {e}")
     return out
 
 # ---------- сбор из X через Nitter RSS ----------
-ONSET_KEYS = ["on set","behind the scenes","со съемок","со съёмок","bts"]
-def parse_nitter_rss(url:str)->List[NewsItem]:
+ONSET = kwmatch.matcher("onset")  # on set / bts / со съёмок — см. keywords.yaml
+def parse_nitter_rss(url:str, only_new:bool=True)->List[NewsItem]:
+    """only_new=False — последние записи ленты целиком (для рубрик, а не для сбора новостей)."""
     out=[]
-    r=fetch(url)
-    if not r: return out
-    feed=feedparser.parse(r.text)
-    for e in feed.entries[:5]:
-        title=html.unescape(e.get("title","")).strip()
-        summary=html.unescape(re.sub("<[^>]+>","", e.get("summary",""))).strip()
-        link=e.get("link","")
-        img=None
-        # у Nitter в summary часто <img ... src=> — вытащим
-        m=re.search(r'<img[^>]+src=["\']([^"\']+)["\']', e.get("summary",""), re.I)
+    base,handle=split_nitter(url)
+    t0=time.time()
+    feed,_=fetch_feed(url, session=S, retries=0)  # повтор — другое зеркало на следующем проходе
+    # nitter на ошибках отдаёт HTML-заглушку со статусом 200 — это тоже провал зеркала
+    alive=bool(feed) and (bool(feed.entries) or not feed.get("bozo"))
+    NITTER_HEALTH.record(base, alive, time.time()-t0, key=handle)
+    learn(key_for("x", handle), feed.entries if alive else None)
+    if not alive: return out
+    entries=HWM.fresh(key_for("x", handle), feed.entries) if only_new else feed.entries[:5]
+    for e in entries:
+        with metrics.stage("extract"):
+            title=html.unescape(e.get("title","")).strip()
+            summary=html.unescape(re.sub("<[^>]+>","", e.get("summary",""))).strip()
+            link=e.get("link","")
+            img=None
+            # у Nitter в summary часто <img ... src=> — вытащим
+            m=re.search(r'<img[^>]+src=["\']([^"\']+)["\']', e.get("summary",""), re.I)
         if m:
             src=m.group(1)
             if src.startswith("//"): src="https:"+src
-            img=src
+            img=src if imgprobe.good(src, session=S) else None
         if title and link:
-            out.append(NewsItem(title, summary, link, img, url))
+            out.append(NewsItem(title, summary, link, img, url, published=entry_ts(e)))
     return out
 
+# ---------- IG как источник новостей: последний кадр профиля ----------
+def ig_mark(img:str)->str:
+    """Устойчивый ключ кадра: подписанный query CDN-ссылки (и сам CDN-хост) меняются
+    от запроса к запросу, поэтому пост узнаём по пути файла; прокси зеркал (…?url=CDN) разворачиваем."""
+    p=requests.utils.urlparse(img)
+    inner=re.search(r"(?:^|&)u(?:rl)?=([^&]+)", p.query)
+    if inner:
+        return ig_mark(requests.utils.unquote(inner.group(1)))
+    return p.path
+
+def parse_ig(username:str)->List[NewsItem]:
+    """Последний кадр профиля: из IG_CACHE, который держит prefetch_ig_forever; зеркала —
+    только если кадра нет или он старше IG_REFRESH_HOURS (найденный кладём в кэш за предзагрузчика)."""
+    e=IG_CACHE.get(username) if IG_CACHE.age(username)<=IG_REFRESH_HOURS*3600 else None
+    if e:
+        img,cap=e["img"],e["cap"]
+    else:
+        img,cap=ig_latest_image(username)
+        got=ig_download(img) if img else None
+        if got: IG_CACHE.put(username, img, cap, *got)
+    mark=ig_mark(img) if img else None
+    POLL.observe(key_for("ig", username), mark, ok=bool(img))
+    if not img: return []
+    cap=(cap or "").strip()
+    title=clamp(cap.split("\n",1)[0], 140) if cap else f"Новый пост @{username}"
+    # у профиля одна «ссылка», поэтому различаем посты по картинке
+    link=f"https://www.instagram.com/{username}/#{h(mark)[:12]}"
+    return [NewsItem(title, cap, link, img, f"ig:@{username}")]
+
 # ---------- IG mirrors: получить последний кадр профиля ----------
-def ig_latest_image(username:str)->Tuple[Optional[str], Optional[str]]:
-    """Пробуем ряд зеркал/прокси, возвращаем (img_url, caption) или (None,None)."""
-    u=username
-    for pat in IG_MIRRORS:
-        url=pat.format(u=u)
-        r=fetch(url)
-        if not r: 
-            continue
-        t=r.text
-        # 1) r.jina JSON: ищем "display_url" и подпись
-        if "jina.ai" in url:
+# Зеркала «соревнуются»: первое стартует сразу, каждое следующее — через IG_HEDGE_SEC
+# или сразу после чужой неудачи; первый годный ответ выигрывает, остальные
+# загрузки обрываются. Порядок старта — по истории успехов и задержек (IG_HEALTH).
+IG_HEALTH = MirrorHealth(os.path.join(BASE, ".state", "ig_health.json"), IG_MIRRORS)
+IG_POOL = ThreadPoolExecutor(max_workers=2*len(IG_MIRRORS), thread_name_prefix="ig")
+# фоновая предзагрузка гоняет зеркала в своём пуле: её запросы не встают в очередь
+# перед подстраховочными запросами сбора и рубрики, и IG_HEDGE_SEC остаётся пределом хвоста
+IG_PREFETCH_POOL = ThreadPoolExecutor(max_workers=len(IG_MIRRORS), thread_name_prefix="ig-prefetch")
+IG_MAX_BYTES = 2*1024*1024
+
+def ig_extract(url:str, t:str)->Tuple[Optional[str], Optional[str]]:
+    """(img_url, caption) из ответа зеркала."""
+    # 1) r.jina JSON: ищем "display_url" и подпись
+    if "jina.ai" in url:
+        with metrics.stage("extract"):
             m=re.search(r'"display_url"\s*:\s*"([^"]+)"', t)
             if m:
                 img=m.group(1).encode("utf-8").decode("unicode_escape")
@@ -317,42 +446,115 @@ def ig_latest_image(username:str)->Tuple[Optional[str], Optional[str]]:
                 if cm:
                     cap=cm.group(1).encode("utf-8").decode("unicode_escape")
                 return img,cap
-        # 2) HTML зеркал: обычный og:image
-        img=extract_image(t)
-        if img:
-            # подпись вытащим как заглушку по заголовку/описанию
-            cap=None
-            m=re.search(r'<meta[^>]+property=["\']og:description["\'][^>]+content=["\']([^"\']+)["\']', t, re.I)
-            if m: cap = html.unescape(m.group(1))
-            return img, cap
+    # 2) HTML зеркал: обычный og:image (стадию extract меряет сам htmlmeta)
+    meta=htmlmeta.parse_html(t)
+    img=htmlmeta.image_of(meta)
+    if img:
+        # подпись вытащим как заглушку по заголовку/описанию
+        return img, meta.get("og:description")
     return None, None
 
+def ig_try(pat:str, u:str, cancel:threading.Event)->Tuple[Optional[str], Optional[str]]:
+    url=pat.format(u=u)
+    t0=time.time()
+    try:
+        with S.get(url, timeout=15, stream=True, retries=0) as r:  # повтор — это следующее зеркало
+            r.raise_for_status()
+            buf=bytearray()
+            for chunk in r.iter_content(16384):
+                if cancel.is_set(): return None, None  # гонку уже выиграли — не докачиваем
+                buf+=chunk
+                if len(buf)>=IG_MAX_BYTES: break
+            t=buf.decode(r.encoding or "utf-8", "replace")
+    except Exception as e:
+        if not cancel.is_set():
+            IG_HEALTH.record(pat, False, time.time()-t0)
+            err.info(f"ig fail {url}: {e}")
+        return None, None
+    res=ig_extract(url, t)
+    # заглушка зеркала вместо кадра — тоже провал: гонка продолжится на других зеркалах
+    if res[0] and not imgprobe.good(res[0], session=S): res=(None, None)
+    IG_HEALTH.record(pat, bool(res[0]), time.time()-t0)
+    return res
+
+def ig_latest_image(username:str, pool:ThreadPoolExecutor=IG_POOL)->Tuple[Optional[str], Optional[str]]:
+    """Гонка зеркал/прокси, возвращаем (img_url, caption) или (None,None).
+    Следующее зеркало выдаёт IG_HEALTH.pick — он же закрепляет пробу полуоткрытого зеркала."""
+    cancel=threading.Event()
+    deadline=time.time()+IG_DEADLINE_SEC
+    pending=set(); tried=[]; spare=[]; more=True
+    try:
+        while True:
+            if more:
+                m=spare.pop(0) if spare else IG_HEALTH.pick(username, exclude=tried)
+                if m is None and not tried:  # все на паузе — всё равно пробуем по порядку
+                    spare=IG_MIRRORS[1:]; m=IG_MIRRORS[0]
+                if m is None: more=False
+                else:
+                    tried.append(m)
+                    pending.add(pool.submit(ig_try, m, username, cancel))
+                    more=len(tried)<len(IG_MIRRORS)
+            if not pending or time.time()>=deadline: break
+            wait_for=IG_HEDGE_SEC if more else deadline-time.time()
+            done,pending=wait(pending, timeout=max(0.0, wait_for), return_when=FIRST_COMPLETED)
+            for f in done:
+                img,cap=f.result()
+                if img: return img,cap
+        return None, None
+    finally:
+        cancel.set()
+
+# ---------- IG: заранее скачанные кадры ----------
+IG_CACHE = IGImageCache(os.path.join(BASE, ".state", "ig_cache"),
+                        max_bytes=int(E("IG_CACHE_MB","200"))*1024*1024)
+IG_IMAGE_MAX = 10*1024*1024  # больше Telegram всё равно не примет файлом
+
+def ig_download(img:str)->Optional[Tuple[bytes,str]]:
+    """(байты, расширение) картинки или None, если это не картинка/слишком большая."""
+    try:
+        with S.get(img, timeout=30, stream=True) as r:
+            r.raise_for_status()
+            mime=(r.headers.get("content-type") or "").split(";")[0].strip()
+            if not mime.startswith("image/"): return None
+            buf=bytearray()
+            for chunk in r.iter_content(65536):
+                buf+=chunk
+                if len(buf)>IG_IMAGE_MAX: return None
+        return bytes(buf), mimetypes.guess_extension(mime) or ".jpg"
+    except Exception as e:
+        err.info(f"ig download {img}: {e}")
+        return None
+
+def prefetch_ig_forever(stop:threading.Event):
+    """Фоном обновляем кадры: сначала актрисы рубрики, потом ig:@ из реестра."""
+    while not stop.is_set():
+        users=ACTRESS_IG+[u for u in REGISTRY.rotations["ig"].items if u not in ACTRESS_IG]
+        stale=[u for u in users if IG_CACHE.age(u) > IG_REFRESH_HOURS*3600]
+        if not stale:
+            stop.wait(600); continue
+        for u in stale:
+            if stop.is_set(): break
+            try:
+                img,cap=ig_latest_image(u, pool=IG_PREFETCH_POOL)
+                got=ig_download(img) if img else None
+                if got: IG_CACHE.put(u, img, cap, *got)
+                IG_HEALTH.save(); imgprobe.CACHE.save()
+            except Exception as e:
+                err.error(f"ig prefetch {u}: {e}")
+            stop.wait(IG_PREFETCH_PAUSE)
+
 # ---------- скоринг для РФ-аудитории ----------
-RU_BOOST = [
-    "Дюна","Dune","Avatar","Аватар","Marvel","DC","Star Wars","Звёздные войны",
-    "Властелин колец","Lord of the Rings","Гарри Поттер","Harry Potter",
-    "Форсаж","Fast & Furious","Mission: Impossible","Top Gun","Alien","Blade Runner",
-    "Last of Us","Ведьмак","Witcher","Sonic","Соник",
-    "Том Круз","Tom Cruise","Киану Ривз","Keanu Reeves","Райан Гослинг","Ryan Gosling",
-    "Марго Робби","Margot Robbie","Зендея","Zendaya","Тимоти Шаламе","Timothée Chalamet",
-    "Педро Паскаль","Pedro Pascal","Киллиан Мёрфи","Cillian Murphy",
-    "Роберт Дауни","Robert Downey","Скарлетт Йоханссон","Scarlett Johansson",
-    "Флоренс Пью","Florence Pugh","Генри Кавилл","Henry Cavill"
-]
-BRANDS = ["netflix","hbo","disney","warner","paramount","sony","marvel","dc","pixar","a24","universal"]
+# веса франшиз/звёзд/студий — в keywords.yaml (группы boost и brands)
+BRAND_MATCHER = kwmatch.matcher("boost","brands")
 
 def brand_score(s:str)->int:
-    s2=s.lower()
-    sc=0
-    for kw in RU_BOOST:
-        if kw.lower() in s2: sc+=10
-    for b in BRANDS:
-        if b in s2: sc+=6
-    return sc
-
-def interest_score(it:NewsItem)->float:
+    return int(BRAND_MATCHER.score(s))
+
+def interest_score(it:NewsItem, brand:Optional[float]=None)->float:
     base = it.likes*0.6 + it.shares*0.8
-    base += brand_score(it.title+" "+it.summary)
+    base += brand_score(it.title+" "+it.summary) if brand is None else brand
+    # сюжет подхватили несколько изданий — это сигнал важности
+    base += min(it.sources-1, 5)*4
     # свежесть
     age = (time.time()-it.ts)/60
     if age <= 60: base += 5
@@ -360,6 +562,115 @@ def interest_score(it:NewsItem)->float:
     if len(it.summary)>800: base -= 5
     return base
 
+# ---------- пул кандидатов окна ----------
+class CandidatePool:
+    """Кандидаты окна, склеенные в сюжеты (clusters): от сюжета держим одну лучшую новость.
+    Повтор по ссылке обновляется на месте, оценка считается при вставке и учитывает,
+    сколько источников пишут о сюжете; в памяти только top-K сюжетов
+    (куча с ленивым удалением устаревших записей)."""
+    def __init__(self, k:int=POOL_TOP_K):
+        self.k=max(1, k)  # POOL_TOP_K=0 — всё равно держим хотя бы один сюжет
+        self.stories=StoryIndex()
+        self.link_bands:Dict[str,Tuple[str,...]]={}  # link -> ключи LSH-полос
+        self.link_seen:Dict[str,Tuple[str,float]]={} # link -> (источник, когда видели)
+        self.items:Dict[int,NewsItem]={}             # сюжет -> лучшая новость
+        self.heap:List[Tuple[float,int,int]]=[]      # (score, seq, сюжет); минимум — худший
+        self.ver:Dict[int,int]={}                    # сюжет -> seq актуальной записи в куче
+        self.seq=0
+        self.lock=threading.Lock()
+
+    def __len__(self)->int:
+        return len(self.items)
+
+    def _push(self, cid:int, it:NewsItem):
+        self.seq+=1
+        self.ver[cid]=self.seq
+        heapq.heappush(self.heap, (it.score, self.seq, cid))
+        if len(self.heap) > 4*self.k:  # слишком много мусора от обновлений — пересобираем
+            self.heap=[(x.score, self.ver[c], c) for c,x in self.items.items()]
+            heapq.heapify(self.heap)
+
+    def _worst(self)->Optional[Tuple[float,int,int]]:
+        while self.heap and self.ver.get(self.heap[0][2])!=self.heap[0][1]:
+            heapq.heappop(self.heap)
+        return self.heap[0] if self.heap else None
+
+    def add_many(self, items:List[NewsItem])->int:
+        """Пачкой: ключевые слова оцениваются одним проходом матчера."""
+        brands=BRAND_MATCHER.score_many([it.title+" "+it.summary for it in items])
+        return sum(self.add(it, b) for it,b in zip(items, brands))
+
+    def add(self, it:NewsItem, brand:Optional[float]=None)->bool:
+        """True — новость представляет свой сюжет в пуле, False — не прошла."""
+        with self.lock:
+            bands=self.link_bands.get(it.link)
+            if bands is None:
+                bands=band_keys(it.title+" "+it.summary[:300]) or (f"link:{h(it.link)}",)
+                self.link_bands[it.link]=bands
+            it.bands=bands
+            self.link_seen[it.link]=(it.source, it.ts)
+            cid,merged=self.stories.assign(bands, it.source)
+            sources=self.stories.size(cid)
+            # претенденты на сюжет: новая, текущая и представители поглощённых сюжетов
+            rivals=[self.items.pop(m) for m in merged if m in self.items]
+            for m in merged: self.ver.pop(m, None)
+            cur=self.items.get(cid)
+            if cur is not None and cur.link==it.link:
+                cur.ts=it.ts
+                cur.likes=max(cur.likes, it.likes); cur.shares=max(cur.shares, it.shares)
+                if not cur.image: cur.image=it.image
+                it,cur=cur,None
+            it.sources=sources
+            it.score=interest_score(it, brand)
+            for x in rivals+([cur] if cur is not None else []):
+                x.sources=sources
+                x.score=interest_score(x)
+                if x.score>it.score: it=x
+            if cid not in self.items and len(self.items)>=self.k:
+                worst=self._worst()
+                if worst is None or it.score<=worst[0]:
+                    return False
+                heapq.heappop(self.heap)
+                del self.items[worst[2]], self.ver[worst[2]]
+            self.items[cid]=it
+            self._push(cid, it)
+            return True
+
+    def ranked(self)->List[NewsItem]:
+        with self.lock:
+            return sorted(self.items.values(), key=lambda x: x.score, reverse=True)
+
+    def discard(self, it:NewsItem):
+        """Убрать сюжет из пула (например, уже опубликован)."""
+        with self.lock:
+            for cid,x in list(self.items.items()):
+                if x is it:
+                    del self.items[cid], self.ver[cid]
+
+    def prune(self, max_age:float):
+        """Для долгоживущего пула: забываем ссылки, попавшие в пул раньше max_age назад
+        (повтором ссылка приходит редко — HWM отдаёт запись ленты один раз), и пересобираем
+        индекс сюжетов из оставшихся — память не растёт со временем. Оценки пересчитываются,
+        так что бонус свежести у старых сюжетов уходит."""
+        cutoff=time.time()-max_age
+        with self.lock:
+            self.link_seen={l:v for l,v in self.link_seen.items() if v[1]>=cutoff}
+            self.link_bands={l:b for l,b in self.link_bands.items() if l in self.link_seen}
+            self.stories=StoryIndex()
+            for l,(src,_) in self.link_seen.items():
+                self.stories.assign(self.link_bands[l], src)
+            items={}
+            for it in self.items.values():
+                if it.ts<cutoff or it.link not in self.link_bands: continue
+                cid=self.stories.find(self.stories.bucket[self.link_bands[it.link][0]])
+                it.sources=self.stories.size(cid)
+                it.score=interest_score(it)
+                if cid not in items or it.score>items[cid].score: items[cid]=it
+            self.items=items
+            self.ver={}; self.heap=[]
+            for cid,it in items.items():
+                self._push(cid, it)
+
 # ---------- формат поста ----------
 def humanize(it:NewsItem)->Tuple[str, Optional[str]]:
     title=clamp(it.title, 140)
@@ -372,49 +683,176 @@ def humanize(it:NewsItem)->Tuple[str, Optional[str]]:
     return caption, it.image
 
 # ---------- публикации ----------
-def publish_best(cands:List[NewsItem])->bool:
+def publish_best(cands:List[NewsItem], pool:Optional[CandidatePool]=None)->bool:
     if not cands: 
         logging.info("Кандидатов нет")
+        metrics.inc("publish_total", result="empty")
         return False
-    for it in cands:
-        it.score = interest_score(it)
-    cands.sort(key=lambda x: x.score, reverse=True)
-    best=cands[0]
-    key=h(best.link or best.title)
-    if SEEN.get(key): 
+    # оценки уже посчитаны пулом; берём лучшего из ещё не опубликованных —
+    # ни по ссылке, ни по сюжету (вчерашняя новость под новым URL тоже дубль)
+    best=None
+    with metrics.stage("dedup"):
+        for it in sorted(cands, key=lambda x: x.score, reverse=True):
+            key=h(it.link or it.title)
+            if not SEEN.get(key) and not any(SEEN.get(f"lsh:{b}") for b in it.bands):
+                best=it; break
+    if best is None:
         logging.info("Уже публиковали: пропуск")
+        metrics.inc("publish_total", result="all_seen")
         return False
     caption,img=humanize(best)
     ok = tg_send_photo(img, caption) if img else tg_send_text(caption)
+    metrics.inc("publish_total", result=("photo" if img else "text") if ok else "send_failed")
     if ok:
-        SEEN[key]=time.time()
-        save_seen(SEEN)
-        logging.info(f"Опубликовано: {best.title} (score={best.score:.1f})")
+        if not outbox.dry_run():  # пробный прогон (profile) сюжет опубликованным не помечает
+            SEEN.mark(key)
+            for b in best.bands:
+                SEEN.mark(f"lsh:{b}", ttl=STORY_TTL_DAYS*86400)
+        if pool is not None: pool.discard(best)
+        logging.info(f"Опубликовано: {best.title} (score={best.score:.1f}, источников={best.sources})")
     return ok
 
-# ---------- сбор кандидатов в течение окна ----------
+# ---------- параллельный опрос источников ----------
+# Пул общий на процесс. Запросы к одному хосту ограничены PER_HOST_LIMIT «дорожками»:
+# каждая дорожка — задача в пуле, которая выбирает URL своего хоста по очереди,
+# поэтому один медленный хост не занимает все потоки и не блокирует остальных.
+POOL = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="fetch")
+
+# Цель опроса — строка: URL ленты, URL Nitter RSS или «ig:@user» (IG-зеркала).
+def parse_any(u:str)->List[NewsItem]:
+    if u.startswith("ig:@"): return parse_ig(u[4:])
+    return (parse_nitter_rss(u) if is_nitter(u) else parse_rss(u))[:5]
+
+def target_group(u:str)->str:
+    # все IG-цели ходят в одни и те же зеркала — считаем их одним «хостом»
+    return "instagram" if u.startswith("ig:@") else host(u)
+
+# Реестр rss_sources.yaml: «ядро» (RSS_LIST + X_HANDLES) опрашивается каждый проход,
+# остальное — по кругу кусками SHARD_* (см. sources.Registry)
+REGISTRY = Registry({"rss":SHARD_RSS, "x":SHARD_X, "ig":SHARD_IG}, core={"rss":RSS_LIST, "x":X_HANDLES})
+
+def cycle_targets()->List[str]:
+    """Цели прохода: просроченные по расписанию POLL источники ядра и реестра."""
+    shard=REGISTRY.next_shard(POLL)
+    core_rss=POLL.pick(RSS_LIST)
+    core_x=[x for x in X_HANDLES if POLL.due(key_for("x", x))]
+    return (core_rss + shard["rss"] + nitter_rss_urls(core_x + shard["x"])
+            + [f"ig:@{u}" for u in shard["ig"]])
+
+# записи дорожек, доработавших после дедлайна: HWM их уже отметил, так что терять нельзя —
+# их отдаёт следующий проход
+LATE:List[NewsItem]=[]
+LATE_LOCK=threading.Lock()
+
+def poll_all(urls:List[str], deadline_sec:float=CYCLE_DEADLINE_SEC)->List[NewsItem]:
+    """Один проход по всем целям: параллельно, с лимитом на хост и общим дедлайном.
+    Что не начали к дедлайну — пропускается до следующего прохода; что дочиталось
+    после него — уходит в LATE и попадает в результат следующего прохода."""
+    deadline=time.time()+deadline_sec
+    by_host:Dict[str,deque]={}
+    for u in urls:
+        by_host.setdefault(target_group(u), deque()).append(u)
+    with LATE_LOCK:
+        out:List[NewsItem]=LATE[:]; LATE.clear()
+    lock=threading.Lock()
+    closed=threading.Event()
+    def lane(q:deque):
+        while time.time()<deadline:
+            try: u=q.popleft()
+            except IndexError: return
+            src=metrics.source_of(u); t0=time.perf_counter()
+            try: items=parse_any(u)
+            except Exception as e:
+                metrics.inc("source_errors_total", source=src)
+                err.info(f"poll {u}: {e}")
+                continue
+            finally:
+                metrics.observe("source_poll_seconds", time.perf_counter()-t0, source=src)
+            metrics.inc("source_items_total", len(items), source=src)
+            with lock:
+                if not closed.is_set(): out.extend(items); continue
+            with LATE_LOCK: LATE.extend(items)
+    futs=[POOL.submit(lane, q) for q in by_host.values()
+          for _ in range(min(PER_HOST_LIMIT, len(q)))]
+    done,pending=wait(futs, timeout=max(0.0, deadline-time.time()))
+    if pending:
+        left=sum(len(q) for q in by_host.values())
+        metrics.inc("poll_skipped_total", left)
+        logging.info(f"Дедлайн прохода: {len(pending)} дорожек не закончили, {left} URL не опрошено")
+    with lock:
+        closed.set()
+        return out[:]
+
+# ---------- сбор кандидатов ----------
+ARCHIVE = Archive()
+
+def collect_pass(pool:CandidatePool, urls:List[str]):
+    """Один проход по источникам: всё найденное — в пул, состояние зеркал и кэшей — на диск."""
+    random.shuffle(urls)
+    with metrics.timer("collect_pass_seconds"):
+        items=poll_all(urls)
+    metrics.inc("collect_targets_total", len(urls))
+    metrics.inc("collect_items_total", len(items))
+    for it in items:
+        it.ts=time.time()
+    with metrics.timer("score_seconds"), metrics.stage("score"):
+        pool.add_many(items)
+    try:
+        ARCHIVE.add_many(items)  # всё увиденное — в архив для weekly_digest / trends
+    except Exception as e:
+        err.error(f"archive: {e}")
+    NITTER_HEALTH.save()
+    IG_HEALTH.save()
+    OG_CACHE.save()
+    imgprobe.CACHE.save()
+    POLL.save()
+
 def collect_window(minutes:int)->List[NewsItem]:
+    """Сбор «окном» для разовых запусков (once / test_news)."""
     start=time.time()
-    collected=[]
-    rss_all = RSS_LIST[:] + nitter_rss_urls()  # обычные RSS + X/Nitter RSS
-    random.shuffle(rss_all)
+    pool=CandidatePool()
     while (time.time()-start) < minutes*60:
         try:
-            # RSS
-            for u in rss_all[:15]:
-                items = (parse_nitter_rss(u) if "/rss" in u else parse_rss(u))[:5]
-                for it in items:
-                    it.ts=time.time()
-                    collected.append(it)
-            time.sleep(20)
+            t0=time.time()
+            collect_pass(pool, cycle_targets())  # RSS + X/Nitter + IG, ядро и кусок реестра
+            time.sleep(max(0.0, CYCLE_PAUSE_SEC-(time.time()-t0)))
         except Exception as e:
             err.error(f"collect loop: {e}")
             time.sleep(5)
-    # уникализируем по ссылке
-    uniq={}
-    for it in collected:
-        uniq[it.link]=it
-    return list(uniq.values())
+    logging.info(f"og-кэш: {OG_CACHE.stats()}")
+    return pool.ranked()
+
+# Фоновый сборщик для постоянного сервиса: опрашивает источники без перерыва на
+# публикации, а публикатор по расписанию берёт лучшее из общего пула.
+LIVE_POOL = CandidatePool()
+
+# то, что и так считается в кэшах/очереди/LLM, — снимаем при каждом чтении метрик
+def _gauges():
+    out=[("pool_candidates", {}, len(LIVE_POOL))]
+    for name,cache in (("og", OG_CACHE), ("imgprobe", imgprobe.CACHE)):
+        out+=metrics.cache_gauges(name, cache.stats())
+    out+=[("feed_fetch", {"result":k}, v) for k,v in feedcache.STATS.items()]
+    out.append(("ig_cache_profiles", {}, len(IG_CACHE.index)))
+    if TELEGRAM_BOT_TOKEN:
+        out+=[("tg_outbox", {"status":k}, v) for k,v in outbox.default(TELEGRAM_BOT_TOKEN).stats().items()]
+    if OPENAI_API_KEY:
+        out+=[(f"llm_{k}", {}, v) for k,v in llm.default(OPENAI_API_KEY).stats().items()]
+    return out
+metrics.add_collector(_gauges)
+
+def collect_forever(stop:threading.Event):
+    while not stop.is_set():
+        t0=time.time()
+        try:
+            collect_pass(LIVE_POOL, cycle_targets())
+        except Exception as e:
+            err.error(f"collector: {e}")
+        stop.wait(max(5.0, CYCLE_PAUSE_SEC-(time.time()-t0)))
+
+def publish_from_pool()->bool:
+    LIVE_POOL.prune(max(POOL_KEEP_MIN, COLLECT_WINDOW_MIN)*60)
+    logging.info(f"Кандидатов в пуле: {len(LIVE_POOL)}; og-кэш: {OG_CACHE.stats()}")
+    return publish_best(LIVE_POOL.ranked(), pool=LIVE_POOL)
 
 # ---------- рубрики ----------
 def post_evening_movies():
@@ -487,30 +925,37 @@ def post_on_set()->bool:
     urls=nitter_rss_urls()
     random.shuffle(urls)
     for u in urls[:12]:
-        items=parse_nitter_rss(u)
+        items=parse_nitter_rss(u, only_new=False)
         for it in items:
-            s=(it.title+" "+it.summary).lower()
-            if any(k in s for k in ONSET_KEYS):
+            if ONSET.any(it.title+" "+it.summary):
                 caption, img = humanize(it)
                 if tg_send_photo(img, caption) if img else tg_send_text(caption):
                     return True
     return False
 
-def post_actress(slot:str)->bool:
-    uname=random.choice(ACTRESS_IG)
-    img,cap=ig_latest_image(uname)
+def actress_caption(uname:str, cap:Optional[str])->str:
     title=f"{uname.replace('_',' ').title()} — свежий кадр"
     body = cap or "Кадр дня из Instagram."
     body = clamp(body, 260)
-    caption=f"<b>{html.escape(title)}</b>\n\n{html.escape(body)}\n\nInstagram: @{uname}"
+    return f"<b>{html.escape(title)}</b>\n\n{html.escape(body)}\n\nInstagram: @{uname}"
+
+def post_actress(slot:str)->bool:
+    # 1) готовый кадр из кэша: свежий и давно не публиковавшийся — без сети до Telegram
+    uname=IG_CACHE.pick(ACTRESS_IG, max_age=2*IG_REFRESH_HOURS*3600, repost_after=IG_REPOST_DAYS*86400)
+    if uname:
+        e=IG_CACHE.get(uname)
+        if tg_send_photo_file(e["path"], actress_caption(uname, e["cap"])):
+            if not outbox.dry_run(): IG_CACHE.mark_posted(uname)
+            return True
+    # 2) кэш пуст (первый запуск) — как раньше, живьём через зеркала
+    uname=random.choice(ACTRESS_IG)
+    img,cap=ig_latest_image(uname)
+    IG_HEALTH.save()
+    caption=actress_caption(uname, cap)
     if img: return tg_send_photo(img, caption)
     else:   return tg_send_text(caption)
 
 # ---------- цикл/расписание ----------
-def should(hour:int, minute:int)->bool:
-    n=now()
-    return n.hour==hour and n.minute<minute
-
 def run_news_once():
     logging.info(f"Сбор новостей {COLLECT_WINDOW_MIN} мин…")
     cands=collect_window(COLLECT_WINDOW_MIN)
@@ -518,42 +963,34 @@ def run_news_once():
     publish_best(cands)
 
 def main():
-    logging.info(f"Старт. TZ={TZ}. Интервал={NEWS_INTERVAL_MIN} min, окно сбора={COLLECT_WINDOW_MIN} min")
-    last_news=0.0
-    while True:
-        try:
-            n=now()
-            daykey=n.strftime("%Y%m%d")
-
-            def once(tag:str, cond:bool, fn):
-                key=f"{tag}:{daykey}"
-                if cond and not SEEN.get(key):
-                    ok=False
-                    try: ok=fn()
-                    except Exception as e: err.error(f"{tag}: {e}")
-                    SEEN[key]=time.time()
-                    save_seen(SEEN)
-                    logging.info(f"{tag}: {'ok' if ok else 'skip'}")
-
-            # спец-рубрики
-            once("weekly", (n.weekday()==0 and should(12,2)), post_weekly_ru_cinemas)  # пн 12:00
-            once("birthday", should(11,2), post_birthday)                               # 11:00
-            once("onset14", should(14,2), post_on_set)                                  # 14:00
-            once("onset19", should(19,2), post_on_set)                                  # 19:00
-            once("actress_morning", should(9,2), lambda: post_actress("morning"))       # 09:00
-            once("actress_evening", should(21,2), lambda: post_actress("evening"))      # 21:00
-            once("evening_movies", should(18,2), post_evening_movies)                   # 18:00
-
-            # новости каждые NEWS_INTERVAL_MIN
-            if time.time()-last_news >= NEWS_INTERVAL_MIN*60:
-                run_news_once()
-                last_news=time.time()
-
-        except KeyboardInterrupt:
-            break
-        except Exception as e:
-            err.error(f"loop: {e}")
-        time.sleep(20)
+    logging.info(f"Старт. TZ={TZ}. Интервал={NEWS_INTERVAL_MIN} min, свежесть кандидатов={COLLECT_WINDOW_MIN} min")
+    logging.info(f"Реестр источников: {REGISTRY.describe()}")
+    stop=threading.Event()
+    metrics.start(stop)  # METRICS_PORT — эндпоинт Prometheus, снимок в logs/metrics.json
+    threading.Thread(target=collect_forever, args=(stop,), name="collector", daemon=True).start()
+    threading.Thread(target=prefetch_ig_forever, args=(stop,), name="ig-prefetch", daemon=True).start()
+
+    sch=Scheduler(SEEN)
+    # спец-рубрики
+    sch.daily("weekly", 12, 0, post_weekly_ru_cinemas, weekday=0)         # пн 12:00
+    sch.daily("birthday", 11, 0, post_birthday)                           # 11:00
+    sch.daily("onset14", 14, 0, post_on_set)                              # 14:00
+    sch.daily("onset19", 19, 0, post_on_set)                              # 19:00
+    sch.daily("actress_morning", 9, 0, lambda: post_actress("morning"))   # 09:00
+    sch.daily("actress_evening", 21, 0, lambda: post_actress("evening"))  # 21:00
+    sch.daily("evening_movies", 18, 0, post_evening_movies)               # 18:00
+    # бывшие cron-сервисы (дайджесты, тренды, история) — тем же процессом, модули грузятся при запуске
+    in_proc=jobs.register(sch)
+    if in_proc: logging.info(f"Задачи в процессе: {', '.join(in_proc)}")
+    # новости каждые NEWS_INTERVAL_MIN; первая — когда сборщик успел пройтись по источникам
+    sch.every("news", NEWS_INTERVAL_MIN*60, publish_from_pool, first_in=max(60, CYCLE_DEADLINE_SEC+CYCLE_PAUSE_SEC))
+    try:
+        sch.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        sch.shutdown()
 
 # ---------- быстрые тесты ----------
 def test_news():
@@ -572,6 +1009,39 @@ def test_birthday():
 def test_onset():
     post_on_set()
 
+# ---------- профилирование ----------
+def profile_cycle(argv:List[str]):
+    """Проход сбора и публикации без отправки в канал (outbox.DRY_RUN): разбивка по стадиям,
+    по желанию — cProfile (--pstats) и стеки для flame graph (--stacks)."""
+    import argparse, profiling
+    ap=argparse.ArgumentParser(prog="main.py profile")
+    ap.add_argument("--minutes", type=float, default=0, help="окно сбора, мин; 0 — один проход")
+    ap.add_argument("--rubrics", action="store_true", help="ещё рубрики: weekly, birthday, onset, actress")
+    ap.add_argument("--jobs", action="store_true", help="ещё задачи jobs.py")
+    ap.add_argument("--pstats", help="файл cProfile (python -m pstats)")
+    ap.add_argument("--stacks", help="свёрнутые стеки для flamegraph.pl / speedscope")
+    ap.add_argument("--interval", type=float, default=5, help="шаг снимков стеков, мс")
+    a=ap.parse_args(argv)
+    outbox.DRY_RUN=True  # до первого outbox.default(): очередь во временном каталоге, без запросов к Telegram
+    os.environ.setdefault("DIGEST_TOPIC", "Фильмы для профилирования")  # daily_digest не сдвигает themes.yaml
+    metrics.set_stage_sample(1.0)
+    with profiling.Session(a.pstats, a.stacks, a.interval/1000) as prof:
+        if a.minutes:
+            cands=collect_window(a.minutes)
+        else:
+            pool=CandidatePool()
+            collect_pass(pool, cycle_targets())
+            cands=pool.ranked()
+        logging.info(f"Кандидатов: {len(cands)}")
+        publish_best(cands)
+        if a.rubrics:
+            for fn in (post_weekly_ru_cinemas, post_birthday, post_on_set, lambda: post_actress("profile")):
+                fn()
+        if a.jobs:
+            for name in jobs.JOBS: jobs.run(name)
+        if TELEGRAM_BOT_TOKEN: outbox.default(TELEGRAM_BOT_TOKEN).flush(30)
+    print(prof.report())
+
 if __name__=="__main__":
     cmd = (sys.argv[1] if len(sys.argv)>1 else "").lower()
     if cmd=="once": run_news_once()
@@ -580,4 +1050,9 @@ if __name__=="__main__":
     elif cmd=="test_weekly": test_weekly()
     elif cmd=="test_birthday": test_birthday()
     elif cmd=="test_onset": test_onset()
+    elif cmd=="profile": profile_cycle(sys.argv[2:])
     else: main()
+    if cmd and TELEGRAM_BOT_TOKEN:
+        left=outbox.default(TELEGRAM_BOT_TOKEN).flush(60)
+        if left: logging.info(f"В очереди Telegram осталось {left}, допошлёт следующий запуск")
+    if cmd: metrics.write_snapshot()
@@ -0,0 +1,292 @@
+"""
+Метрики процесса: счётчики и гистограммы задержек с метками.
+
+Отдаются в текстовом формате Prometheus на http://METRICS_HOST:METRICS_PORT/metrics
+(порт 0 — эндпоинт выключен) и раз в METRICS_SNAPSHOT_SEC пишутся снимком в
+logs/metrics.json — по нему видно, какие источники медленные, какие зеркала
+мертвы и сколько на самом деле длится проход сбора, без Prometheus под рукой.
+
+- install() вешает хук на все HTTP-клиенты процесса (http_client): задержка,
+  статусы и сетевые ошибки по хосту, без правок в местах вызова;
+- inc()/observe()/timer() — счётчики и гистограммы из кода (публикации,
+  проходы сбора, источники, LLM, Telegram);
+- add_collector(fn) — значения, которые и так считаются в другом месте
+  (кэши, feedcache, llm.stats, очередь outbox), снимаются при каждом чтении;
+- stage("extract") — таймер стадии горячего пути в stage_seconds{stage}. Меряется
+  случайная доля STAGE_SAMPLE вызовов (по умолчанию 5%), так что в проде он почти
+  бесплатен; main.py profile включает его на все вызовы (set_stage_sample(1)).
+"""
+import os, json, time, random, logging, threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import http_client
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# METRICS_* и STAGE_SAMPLE читаются в install()/start()/write_snapshot(), а не при импорте —
+# так настройки из .env работают, в каком бы порядке ни импортировались модули
+STAGE_SAMPLE = 0.05
+_stage_forced = False
+
+
+def _snapshot_path() -> str:
+    return os.getenv("METRICS_SNAPSHOT", os.path.join(BASE, "logs", "metrics.json"))
+
+Labels = Tuple[Tuple[str, str], ...]
+Gauge = Tuple[str, Dict[str, str], float]
+
+
+def _labels(kw: dict) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in kw.items()))
+
+
+def _fmt(labels: Labels, extra: Labels = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+
+class Registry:
+    def __init__(self, buckets: Iterable[float] = BUCKETS):
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.hists: Dict[str, Dict[Labels, list]] = {}  # [по корзинам..., sum, count]
+        self.collectors: List[Callable[[], Iterable[Gauge]]] = []
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = _labels(labels)
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _labels(labels)
+        with self.lock:
+            h = self.hists.setdefault(name, {}).get(key)
+            if h is None:
+                h = self.hists[name][key] = [0] * (len(self.buckets) + 2)
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    h[i] += 1
+            h[-2] += value
+            h[-1] += 1
+
+    def add_collector(self, fn: Callable[[], Iterable[Gauge]]):
+        self.collectors.append(fn)
+
+    def totals(self, name: str) -> Dict[Labels, Tuple[int, float]]:
+        """(число, сумма) по каждой серии гистограммы name."""
+        with self.lock:
+            return {k: (h[-1], h[-2]) for k, h in self.hists.get(name, {}).items()}
+
+    def _gauges(self) -> Dict[str, Dict[Labels, float]]:
+        out: Dict[str, Dict[Labels, float]] = {}
+        for fn in list(self.collectors):
+            try:
+                for name, labels, value in fn():
+                    out.setdefault(name, {})[_labels(labels)] = float(value)
+            except Exception as e:
+                logging.debug(f"metrics collector: {e}")
+        return out
+
+    def quantile(self, h: list, q: float) -> Optional[float]:
+        """Оценка квантиля по корзинам: верхняя граница корзины, где набралась доля q."""
+        if not h[-1]:
+            return None
+        for i, b in enumerate(self.buckets):
+            if h[i] >= q * h[-1]:
+                return b
+        return float("inf")
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus (exposition format 0.0.4)."""
+        gauges = self._gauges()
+        lines = []
+        with self.lock:
+            for name in sorted(self.counters):
+                lines.append(f"# TYPE {name} counter")
+                for key, v in sorted(self.counters[name].items()):
+                    lines.append(f"{name}{_fmt(key)} {v:g}")
+            for name in sorted(self.hists):
+                lines.append(f"# TYPE {name} histogram")
+                for key, h in sorted(self.hists[name].items()):
+                    for i, b in enumerate(self.buckets):
+                        lines.append(f"{name}_bucket{_fmt(key, (('le', f'{b:g}'),))} {h[i]}")
+                    lines.append(f"{name}_bucket{_fmt(key, (('le', '+Inf'),))} {h[-1]}")
+                    lines.append(f"{name}_sum{_fmt(key)} {h[-2]:.6f}")
+                    lines.append(f"{name}_count{_fmt(key)} {h[-1]}")
+        for name in sorted(gauges):
+            lines.append(f"# TYPE {name} gauge")
+            for key, v in sorted(gauges[name].items()):
+                lines.append(f"{name}{_fmt(key)} {v:g}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """То же в JSON: у гистограмм — число, среднее и оценки p50/p95 вместо корзин."""
+        gauges = self._gauges()
+        with self.lock:
+            counters = {f"{n}{_fmt(k)}": v for n, s in self.counters.items() for k, v in s.items()}
+            hists = {}
+            for n, s in self.hists.items():
+                for k, h in s.items():
+                    hists[f"{n}{_fmt(k)}"] = {"count": h[-1], "sum": round(h[-2], 3),
+                                              "avg": round(h[-2] / h[-1], 3) if h[-1] else 0.0,
+                                              "p50": self.quantile(h, 0.5), "p95": self.quantile(h, 0.95)}
+        return {"ts": time.time(), "counters": counters, "histograms": hists,
+                "gauges": {f"{n}{_fmt(k)}": v for n, s in gauges.items() for k, v in s.items()}}
+
+    def write_snapshot(self, path: Optional[str] = None):
+        path = path or _snapshot_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=1, default=str)
+        os.replace(tmp, path)
+
+
+REGISTRY = Registry()
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+add_collector = REGISTRY.add_collector
+render = REGISTRY.render
+write_snapshot = REGISTRY.write_snapshot
+
+
+@contextmanager
+def timer(name: str, **labels):
+    """with timer("collect_pass_seconds"): ... — время блока в гистограмму, и при исключении тоже."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - t0, **labels)
+
+
+class stage:
+    """with stage("extract"): ... — время блока в stage_seconds{stage}, для доли STAGE_SAMPLE вызовов."""
+    __slots__ = ("name", "t0")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.t0 = time.perf_counter() if STAGE_SAMPLE >= 1 or random.random() < STAGE_SAMPLE else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self.t0 is not None:
+            observe("stage_seconds", time.perf_counter() - self.t0, stage=self.name)
+
+
+def set_stage_sample(rate: float):
+    global STAGE_SAMPLE, _stage_forced
+    STAGE_SAMPLE = rate
+    _stage_forced = True
+
+
+def cache_gauges(name: str, stats: dict) -> List[Gauge]:
+    """DiskLRU.stats() → попадания, промахи и доля попаданий с меткой cache=name."""
+    lb = {"cache": name}
+    return [("cache_hits", lb, stats.get("hits", 0)), ("cache_misses", lb, stats.get("misses", 0)),
+            ("cache_hit_ratio", lb, stats.get("hit_rate", 0.0)), ("cache_items", lb, stats.get("items", 0))]
+
+
+def source_of(url: str) -> str:
+    """Метка источника: хост без www. (ig:@user → instagram — все IG-цели ходят в одни зеркала)."""
+    if url.startswith("ig:@"):
+        return "instagram"
+    h = urlsplit(url).hostname or "?"
+    return h[4:] if h.startswith("www.") else h
+
+
+def fetched(source: str, seconds: float, r=None, error: Optional[BaseException] = None):
+    """Итог скачивания на уровне источника (fetch, http_get): время, байты тела, ошибки."""
+    observe("fetch_seconds", seconds, source=source)
+    if r is not None:
+        inc("fetch_bytes_total", len(r.content), source=source)
+    if error is not None:
+        inc("fetch_errors_total", source=source, error=type(error).__name__)
+
+
+# ---------- HTTP-хук ----------
+def _http_hook(method: str, host: str, status: int, seconds: float, error: Optional[BaseException]):
+    observe("http_request_seconds", seconds, host=host, method=method)
+    if STAGE_SAMPLE >= 1 or random.random() < STAGE_SAMPLE:
+        observe("stage_seconds", seconds, stage="net")  # до заголовков ответа; поток тела — в стадии вызывающего
+    if error is not None:
+        inc("http_errors_total", host=host, error=type(error).__name__)
+    else:
+        inc("http_responses_total", host=host, status=status)
+
+
+_installed = False
+_install_lock = threading.Lock()
+
+
+def install():
+    """Хук времени на все HTTP-клиенты процесса (один раз); доля STAGE_SAMPLE — из окружения."""
+    global _installed, STAGE_SAMPLE
+    with _install_lock:
+        if not _stage_forced:
+            STAGE_SAMPLE = float(os.getenv("STAGE_SAMPLE", "0.05"))
+        if not _installed:
+            http_client.add_timing_hook(_http_hook)
+            _installed = True
+
+
+# ---------- эндпоинт и снимки ----------
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *a):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _snapshot_forever(stop: threading.Event, every: float):
+    while not stop.wait(every):
+        try:
+            write_snapshot()
+        except Exception as e:
+            logging.warning(f"metrics snapshot: {e}")
+
+
+_started = False
+
+
+def start(stop: Optional[threading.Event] = None, port: Optional[int] = None, every: Optional[float] = None):
+    """Для постоянного сервиса: эндпоинт (если port) и периодический снимок (если every).
+    Без аргументов — METRICS_PORT (0 — выключен) и METRICS_SNAPSHOT_SEC из окружения."""
+    global _started
+    install()
+    if _started:
+        return
+    _started = True
+    port = int(os.getenv("METRICS_PORT", "0")) if port is None else port
+    every = float(os.getenv("METRICS_SNAPSHOT_SEC", "60")) if every is None else every
+    host = os.getenv("METRICS_HOST", "127.0.0.1")
+    if port:
+        try:
+            srv = ThreadingHTTPServer((host, port), _Handler)
+            srv.daemon_threads = True
+            threading.Thread(target=srv.serve_forever, name="metrics", daemon=True).start()
+            logging.info(f"Метрики: http://{host}:{port}/metrics")
+        except OSError as e:
+            logging.warning(f"metrics: порт {port} недоступен ({e})")
+    if every > 0:
+        threading.Thread(target=_snapshot_forever, args=(stop or threading.Event(), every),
+                         name="metrics-snapshot", daemon=True).start()
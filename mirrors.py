@@ -0,0 +1,123 @@
+"""
+Здоровье зеркал (Nitter, IG и т.п.): скользящие EWMA задержки и доли ошибок,
+автомат «предохранителя» (закрыт → открыт → полуоткрыт) и выбор лучшего зеркала.
+
+- после FAIL_THRESHOLD ошибок подряд зеркало «открывается» на cooldown секунд
+  (каждое повторное падение удваивает паузу до MAX_COOLDOWN);
+- когда пауза истекла, зеркалу отдаётся ровно один пробный запрос (half-open):
+  успех закрывает предохранитель, ошибка снова открывает;
+- pick(key) закрепляет за ключом (X-хэндл, IG-ник) зеркало, которое для него
+  сработало, иначе отдаёт самое быстрое живое; pick(key, exclude=…) по очереди
+  выдаёт зеркала для гонки (IG), не раздавая одну пробу нескольким потокам.
+Состояние переживает рестарт: JSON в .state/.
+"""
+import os, json, time, logging, threading
+from typing import Dict, Iterable, List, Optional
+
+ALPHA = 0.3
+FAIL_THRESHOLD = 3
+COOLDOWN = 300
+MAX_COOLDOWN = 3600
+ERR_PENALTY = 3.0  # во сколько раз ошибки «дороже» задержки при ранжировании
+PROBE_TIMEOUT = 120  # проба, не отчитавшаяся за это время, считается потерянной
+
+
+class MirrorHealth:
+    def __init__(self, path: str, mirrors: List[str]):
+        self.path = path
+        self.mirrors = list(mirrors)
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.stats: Dict[str, dict] = {}
+        self.by_key: Dict[str, str] = {}
+        self._load()
+        for m in self.mirrors:
+            self.stats.setdefault(m, self._fresh())
+        # пробы, начатые до рестарта, не завершились
+        for st in self.stats.values():
+            st["probing"] = 0.0
+
+    @staticmethod
+    def _fresh() -> dict:
+        return {"lat": 1.0, "err": 0.0, "fails": 0, "open_until": 0.0,
+                "cooldown": COOLDOWN, "probing": 0.0, "ok": 0, "bad": 0}
+
+    def _load(self):
+        if not os.path.isfile(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.stats = {m: {**self._fresh(), **st} for m, st in data.get("stats", {}).items()
+                          if m in self.mirrors}
+            self.by_key = {k: m for k, m in data.get("by_key", {}).items() if m in self.mirrors}
+        except Exception as e:
+            logging.warning(f"mirrors load {self.path}: {e}")
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            data = json.dumps({"stats": self.stats, "by_key": self.by_key})
+            self.dirty = False
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            logging.warning(f"mirrors save {self.path}: {e}")
+
+    def _cost(self, m: str) -> float:
+        st = self.stats[m]
+        return st["lat"] * (1 + ERR_PENALTY * st["err"])
+
+    def _usable(self, m: str, now: float) -> bool:
+        st = self.stats[m]
+        if st["fails"] < FAIL_THRESHOLD:
+            return True
+        return st["open_until"] <= now and now - st["probing"] > PROBE_TIMEOUT
+
+    def pick(self, key: str = "", exclude: Iterable[str] = ()) -> Optional[str]:
+        """Зеркало для ключа (кроме exclude — уже испробованных в этой гонке);
+        None — все остальные зеркала на паузе. Полуоткрытое зеркало отдаётся только
+        одному вызывающему: пробный запрос за ним закрепляется здесь же."""
+        now = time.time()
+        exclude = set(exclude)
+        with self.lock:
+            m = self.by_key.get(key)
+            if not m or m in exclude or not self._usable(m, now):
+                live = [x for x in self.mirrors if x not in exclude and self._usable(x, now)]
+                if not live:
+                    return None
+                m = min(live, key=self._cost)
+            st = self.stats[m]
+            if st["fails"] >= FAIL_THRESHOLD:
+                st["probing"] = now  # half-open: единственный пробный запрос
+            return m
+
+    def record(self, m: str, ok: bool, latency: float, key: str = ""):
+        with self.lock:
+            st = self.stats.get(m)
+            if st is None:
+                return
+            st["probing"] = 0.0
+            st["err"] = (1 - ALPHA) * st["err"] + ALPHA * (0.0 if ok else 1.0)
+            if ok:
+                st["lat"] = (1 - ALPHA) * st["lat"] + ALPHA * latency
+                st["ok"] += 1
+                st["fails"] = 0
+                st["cooldown"] = COOLDOWN
+                st["open_until"] = 0.0
+                if key:
+                    self.by_key[key] = m
+            else:
+                st["bad"] += 1
+                st["fails"] += 1
+                if st["fails"] >= FAIL_THRESHOLD:
+                    if st["open_until"]:  # уже открывался — пробы не помогли
+                        st["cooldown"] = min(MAX_COOLDOWN, st["cooldown"] * 2)
+                    st["open_until"] = time.time() + st["cooldown"]
+                if key and self.by_key.get(key) == m:
+                    del self.by_key[key]
+            self.dirty = True
@@ -0,0 +1,380 @@
+"""
+Исходящая очередь Telegram на SQLite (.state/outbox.sqlite).
+
+enqueue() только пишет строку и сразу возвращается — сбор и расписание больше
+не ждут Telegram. Отдельный поток-отправитель берёт готовые сообщения по
+очереди и:
+- соблюдает лимит на чат (не чаще раза в CHAT_INTERVAL секунд — для каналов
+  Telegram это около 20 сообщений в минуту); время следующей отправки в чат
+  хранится в той же базе, так что лимит общий для всех процессов;
+- на 429 ждёт ровно retry_after из ответа, на сетевые ошибки и 5xx — с
+  экспоненциальной паузой, до MAX_ATTEMPTS попыток;
+- если Telegram не смог скачать фото по URL, качает его на диск и перезаливает
+  файлом (слишком большое — уменьшив);
+- запоминает file_id, который Telegram вернул на sendPhoto (по URL картинки и
+  по хэшу файла), и дальше шлёт ту же картинку по file_id одним запросом;
+- записывает итог: sent (с message_id) или failed (с текстом ошибки).
+Очередь общая для бота и крон-скриптов: строку забирает тот, кто первым
+пометил её «sending», так что два процесса не отправят одно и то же дважды.
+
+DRY_RUN (TG_DRY_RUN=true, main.py profile) — очередь во временном каталоге и
+«отправка» без запроса к Telegram: весь путь до сети работает, канал и общая
+очередь не видят ничего.
+"""
+import os, json, time, random, shutil, hashlib, sqlite3, logging, tempfile, mimetypes, threading
+from typing import List, Optional
+
+import requests
+
+import http_client
+import imgprobe
+import metrics
+from kvcache import DiskLRU
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+STATE = os.path.join(BASE, ".state")
+DB_PATH = os.path.join(STATE, "outbox.sqlite")
+SPOOL = os.path.join(STATE, "outbox_files")
+FILE_IDS = os.path.join(STATE, "tg_file_ids.json")
+
+API_BASE = os.getenv("TG_API_BASE", "https://api.telegram.org")
+CHAT_INTERVAL = float(os.getenv("TG_CHAT_INTERVAL", "3"))
+MAX_ATTEMPTS = 8
+BACKOFF_BASE = 5.0
+BACKOFF_MAX = 900.0
+STALE_SENDING = 600      # «sending» дольше этого — отправитель упал, возвращаем в очередь
+SEND_HOLD = 120          # на время отправки чат занят для других процессов (упавший отправитель не держит дольше)
+KEEP_DONE = 7 * 86400    # сколько хранить отправленные/проваленные записи
+DRY_RUN = False          # main.py profile включает сам; TG_DRY_RUN из окружения смотрит dry_run()
+err = logging.getLogger("err")
+
+
+class Outbox:
+    def __init__(self, token: str, path: str = DB_PATH, session: Optional[requests.Session] = None,
+                 chat_interval: float = CHAT_INTERVAL, dry_run: bool = False):
+        self.token = token
+        self.dry_run = dry_run
+        self.session = session or http_client.shared()
+        self.chat_interval = chat_interval
+        self.owner = f"{os.getpid()}:{id(self):x}"
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.done = threading.Condition()
+        self.thread: Optional[threading.Thread] = None
+        # в пробном режиме file_id выдуманные — общий кэш ими не засоряем
+        self.file_ids = DiskLRU(os.path.join(os.path.dirname(path), "tg_file_ids.json") if dry_run else FILE_IDS,
+                                max_items=20000, ttl=180 * 86400)
+        os.makedirs(SPOOL, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS outbox ("
+                        "id INTEGER PRIMARY KEY AUTOINCREMENT, chat TEXT NOT NULL, method TEXT NOT NULL, "
+                        "data TEXT NOT NULL, file TEXT, field TEXT, status TEXT NOT NULL, "
+                        "attempts INTEGER NOT NULL DEFAULT 0, next_at REAL NOT NULL, owner TEXT, "
+                        "created REAL NOT NULL, updated REAL NOT NULL, error TEXT, message_id INTEGER)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS outbox_ready ON outbox(status, next_at)")
+        # когда в чат можно следующее сообщение — в общей базе, чтобы лимит делили бот и крон-скрипты
+        self.db.execute("CREATE TABLE IF NOT EXISTS chat_rate (chat TEXT PRIMARY KEY, next_at REAL NOT NULL)")
+        self._requeue_stale()
+
+    # ---------- постановка ----------
+    def enqueue(self, method: str, data: dict, file: Optional[str] = None, field: str = "photo") -> int:
+        """Кладёт вызов API в очередь; file копируется в спул (оригинал можно менять/удалять)."""
+        spooled = None
+        if file:
+            spooled = os.path.join(SPOOL, f"{time.time_ns()}{os.path.splitext(file)[1] or '.jpg'}")
+            shutil.copyfile(file, spooled)
+            if imgprobe.needs_shrink(spooled):
+                small = imgprobe.shrink(spooled)
+                if small:
+                    os.remove(spooled)
+                    spooled = small
+        now = time.time()
+        with self.lock:
+            cur = self.db.execute("INSERT INTO outbox(chat, method, data, file, field, status, next_at, created, updated) "
+                                  "VALUES (?,?,?,?,?,'queued',?,?,?)",
+                                  (str(data.get("chat_id", "")), method, json.dumps(data, ensure_ascii=False),
+                                   spooled, field if spooled else None, now, now, now))
+        self.wake.set()
+        return cur.lastrowid
+
+    def status(self, mid: int) -> Optional[str]:
+        with self.lock:
+            row = self.db.execute("SELECT status FROM outbox WHERE id=?", (mid,)).fetchone()
+        return row[0] if row else None
+
+    def wait(self, mid: int, timeout: float) -> str:
+        """Ждёт итога не дольше timeout; 'queued'/'sending' — ещё не доставлено, но не потеряно."""
+        end = time.time() + timeout
+        st = self.status(mid)
+        while st in ("queued", "sending") and time.time() < end:
+            with self.done:
+                self.done.wait(min(1.0, max(0.0, end - time.time())))
+            st = self.status(mid)
+        return st or "failed"
+
+    def flush(self, timeout: float) -> int:
+        """Перед выходом разового скрипта: ждёт, пока уйдёт всё, что можно отправить сейчас.
+        Возвращает, сколько сообщений осталось в очереди (их допошлёт следующий запуск)."""
+        end = time.time() + timeout
+        while True:
+            with self.lock:
+                left = self.db.execute("SELECT COUNT(*) FROM outbox WHERE status IN ('queued','sending')").fetchone()[0]
+                ready = self.db.execute("SELECT COUNT(*) FROM outbox WHERE (status='queued' AND next_at<=?) "
+                                        "OR (status='sending' AND owner=?)", (end, self.owner)).fetchone()[0]
+            if not ready or time.time() >= end:
+                return left
+            self.wake.set()
+            with self.done:
+                self.done.wait(0.5)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return dict(self.db.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+
+    # ---------- отправитель ----------
+    def start(self) -> "Outbox":
+        if not self.thread:
+            self.thread = threading.Thread(target=self._loop, name="tg-outbox", daemon=True)
+            self.thread.start()
+        return self
+
+    def _claim(self) -> Optional[tuple]:
+        """Самое старое готовое сообщение в чат, у которого не исчерпан лимит; чат занимается
+        на SEND_HOLD в той же транзакции, так что другой процесс в него параллельно не пошлёт."""
+        now = time.time()
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.db.execute("SELECT o.id, o.chat, o.method, o.data, o.file, o.field, o.attempts "
+                                      "FROM outbox o LEFT JOIN chat_rate c ON c.chat=o.chat "
+                                      "WHERE o.status='queued' AND o.next_at<=? AND COALESCE(c.next_at, 0)<=? "
+                                      "ORDER BY o.id LIMIT 1", (now, now)).fetchone()
+                if row:
+                    self.db.execute("UPDATE outbox SET status='sending', owner=?, updated=? WHERE id=?",
+                                    (self.owner, now, row[0]))
+                    self.db.execute("INSERT OR REPLACE INTO chat_rate(chat, next_at) VALUES (?,?)",
+                                    (row[1], now + SEND_HOLD))
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        return row
+
+    def _chat_after(self, chat: str, seconds: float):
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO chat_rate(chat, next_at) VALUES (?,?)",
+                            (chat, time.time() + seconds))
+
+    def _next_wake(self) -> float:
+        """Когда что-то из очереди станет готово: и по своему next_at, и по лимиту чата."""
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT MIN(MAX(o.next_at, COALESCE(c.next_at, 0))) FROM outbox o "
+                                  "LEFT JOIN chat_rate c ON c.chat=o.chat WHERE o.status='queued'").fetchone()
+        nxt = row[0] if row and row[0] else now + 60
+        return min(60.0, max(0.2, nxt - now))
+
+    def _loop(self):
+        last_purge, last_requeue = 0.0, time.time()
+        while True:
+            # зависшие «sending» упавшего отправителя дозревают до STALE_SENDING уже после
+            # нашего старта — проверяем их по ходу работы, а не только при запуске
+            if time.time() - last_requeue > 60:
+                last_requeue = time.time()
+                self._requeue_stale()
+            if time.time() - last_purge > 3600:
+                last_purge = time.time()
+                self._purge()
+            self.wake.clear()
+            row = self._claim()
+            if not row:
+                self.wake.wait(self._next_wake())
+                continue
+            try:
+                with metrics.stage("tg_send"):
+                    self._deliver(*row)
+            except Exception as e:
+                err.error(f"outbox #{row[0]}: {e}")
+                self._chat_after(row[1], self.chat_interval)  # не держим чат занятым SEND_HOLD
+                self._retry(row[0], row[6] + 1, str(e), None)
+
+    def _post(self, method: str, data: dict, file: Optional[str], field: Optional[str]) -> tuple:
+        """(http-код, json-ответ); сетевые ошибки — код 0."""
+        if self.dry_run:
+            return 200, {"ok": True, "result": {"message_id": 0}}
+        url = f"{API_BASE}/bot{self.token}/{method}"
+        try:
+            if file:
+                mime = mimetypes.guess_type(file)[0] or "image/jpeg"
+                with open(file, "rb") as f:
+                    r = self.session.post(url, data=data, files={field: (os.path.basename(file), f, mime)}, timeout=60)
+            else:
+                r = self.session.post(url, data=data, timeout=25)
+        except requests.RequestException as e:
+            return 0, {"description": str(e)}
+        try:
+            return r.status_code, r.json()
+        except ValueError:
+            return r.status_code, {"description": r.text[:400]}
+
+    def _photo_keys(self, method: str, payload: dict, file: Optional[str]) -> List[str]:
+        """Ключи кэша file_id: по URL картинки и/или по хэшу содержимого файла."""
+        if method != "sendPhoto":
+            return []
+        if file:
+            return [f"sha:{_sha1_file(file)}"]
+        photo = str(payload.get("photo", ""))
+        return [f"url:{photo}"] if photo.startswith("http") else []
+
+    def _deliver(self, mid: int, chat: str, method: str, data: str, file: Optional[str],
+                 field: Optional[str], attempts: int):
+        payload = json.loads(data)
+        keys = self._photo_keys(method, payload, file)
+        code = None
+        fid = next((f for f in (self.file_ids.get(k, None) for k in keys) if f), None)
+        if fid:
+            # картинка уже была у Telegram — один маленький запрос вместо скачивания/заливки
+            code, js = self._post(method, {**payload, "photo": fid}, None, None)
+            if code == 400:  # file_id больше не действует — шлём как обычно
+                for k in keys:
+                    self.file_ids.pop(k)
+                code = None
+        if code is None:
+            code, js = self._post(method, payload, file, field)
+        if code == 400 and method == "sendPhoto" and not file and str(payload.get("photo", "")).startswith("http"):
+            # Telegram не смог скачать картинку по URL — качаем на диск и заливаем сами
+            path = self._download(payload["photo"])
+            if path:
+                payload.pop("photo")
+                file, field = path, "photo"
+                keys.append(f"sha:{_sha1_file(path)}")
+                with self.lock:
+                    self.db.execute("UPDATE outbox SET data=?, file=?, field='photo', updated=? WHERE id=?",
+                                    (json.dumps(payload, ensure_ascii=False), path, time.time(), mid))
+                code, js = self._post(method, payload, file, field)
+        self._chat_after(chat, self.chat_interval)
+        attempts += 1
+        if code == 200 and js.get("ok"):
+            result = js.get("result") or {}
+            if keys and result.get("photo"):
+                fid = result["photo"][-1]["file_id"]  # самый крупный размер
+                for k in keys:
+                    self.file_ids.set(k, fid)
+                self.file_ids.save()
+            self._finish(mid, "sent", attempts, None, result.get("message_id"))
+            return
+        desc = str(js.get("description", ""))[:400]
+        if code == 429:
+            metrics.inc("tg_rate_limited_total", method=method)
+            retry_after = float((js.get("parameters") or {}).get("retry_after", 5))
+            self._chat_after(chat, retry_after)
+            logging.info(f"TG {method}: 429, ждём {retry_after:.0f} c")
+            # упёрлись в лимит — это не «неудачная попытка»
+            self._retry(mid, attempts - 1, desc, time.time() + retry_after)
+            return
+        if 400 <= code < 500:  # запрос неверен — повтор не поможет
+            self._finish(mid, "failed", attempts, f"{code} {desc}")
+            return
+        self._retry(mid, attempts, f"{code} {desc}", None)
+
+    def _download(self, url: str) -> Optional[str]:
+        """Картинка в спул потоком; тяжёлую или слишком большую — уменьшаем (imgprobe.shrink)."""
+        try:
+            with self.session.get(url, timeout=30, stream=True) as r:
+                r.raise_for_status()
+                mime = (r.headers.get("content-type") or "").split(";")[0].strip() or "image/jpeg"
+                path = os.path.join(SPOOL, f"{time.time_ns()}{mimetypes.guess_extension(mime) or '.jpg'}")
+                size = 0
+                with open(path, "wb") as f:
+                    for chunk in r.iter_content(65536):
+                        size += len(chunk)
+                        if size > imgprobe.MAX_DOWNLOAD:
+                            break
+                        f.write(chunk)
+        except Exception as e:
+            err.error(f"outbox reupload {url}: {e}")
+            return None
+        if size > imgprobe.MAX_DOWNLOAD:
+            os.remove(path)
+            return None
+        if imgprobe.needs_shrink(path):
+            small = imgprobe.shrink(path)
+            os.remove(path)
+            if not small:
+                err.error(f"outbox reupload {url}: {size} байт, уменьшить не удалось")
+            return small
+        return path
+
+    def _retry(self, mid: int, attempts: int, error: str, at: Optional[float]):
+        if attempts >= MAX_ATTEMPTS:
+            self._finish(mid, "failed", attempts, error)
+            return
+        if at is None:
+            at = time.time() + min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempts) * random.uniform(0.8, 1.2)
+        with self.lock:
+            self.db.execute("UPDATE outbox SET status='queued', owner=NULL, attempts=?, next_at=?, updated=?, error=? "
+                            "WHERE id=?", (attempts, at, time.time(), error, mid))
+
+    def _finish(self, mid: int, status: str, attempts: int, error: Optional[str] = None,
+                message_id: Optional[int] = None):
+        with self.lock:
+            row = self.db.execute("SELECT file, method, created FROM outbox WHERE id=?", (mid,)).fetchone()
+            self.db.execute("UPDATE outbox SET status=?, owner=NULL, attempts=?, updated=?, error=?, "
+                            "message_id=? WHERE id=?", (status, attempts, time.time(), error, message_id, mid))
+        if row and row[0]:
+            try:
+                os.remove(row[0])
+            except OSError:
+                pass
+        if row:
+            metrics.inc("tg_delivered_total", method=row[1], status=status)
+            metrics.observe("tg_delivery_seconds", time.time() - row[2], method=row[1])  # от постановки в очередь
+        if status == "failed":
+            err.error(f"TG {row[1] if row else ''} #{mid} не доставлено: {error}")
+        with self.done:
+            self.done.notify_all()
+
+    def _requeue_stale(self):
+        with self.lock:
+            n = self.db.execute("UPDATE outbox SET status='queued', owner=NULL WHERE status='sending' AND updated<?",
+                                (time.time() - STALE_SENDING,)).rowcount
+        if n:
+            logging.info(f"outbox: {n} зависших сообщений вернули в очередь")
+            self.wake.set()
+
+    def _purge(self):
+        with self.lock:
+            self.db.execute("DELETE FROM outbox WHERE status IN ('sent','failed') AND updated<?",
+                            (time.time() - KEEP_DONE,))
+
+
+def _sha1_file(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def dry_run() -> bool:
+    """Пробный режим: DRY_RUN или TG_DRY_RUN=true (читается при вызове — .env мог загрузиться позже импорта)."""
+    return DRY_RUN or os.getenv("TG_DRY_RUN", "").lower() == "true"
+
+
+_default: Optional[Outbox] = None
+_default_lock = threading.Lock()
+
+
+def default(token: str) -> Outbox:
+    """Общая очередь процесса с уже запущенным отправителем."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            if dry_run():
+                _default = Outbox(token, path=os.path.join(tempfile.mkdtemp(prefix="outbox-dry-"), "outbox.sqlite"),
+                                  dry_run=True).start()
+            else:
+                _default = Outbox(token).start()
+        return _default
@@ -0,0 +1,88 @@
+"""
+Адаптивные интервалы опроса источников.
+
+Каждый источник сам «учит» свой интервал по тому, что видит в ленте: появилась
+запись новее прежней — интервал сокращается вдвое (до MIN), ничего нового —
+растёт в BACKOFF раз (до MAX). Variety быстро выходит на минимальный интервал,
+а студийный аккаунт, который постит пару раз в неделю, — на максимальный.
+Ошибка загрузки интервал не трогает: источник просто ждёт следующего срока.
+Состояние хранится в .state/poll_intervals.json.
+"""
+import os, json, time, random, logging, threading
+from typing import Dict, Iterable, List, Optional, Union
+
+MIN_INTERVAL = 20.0
+MAX_INTERVAL = 3600.0
+START_INTERVAL = 120.0
+BACKOFF = 1.5
+JITTER = 0.1  # ±10%, чтобы источники не выстраивались в одну очередь
+
+
+class PollSchedule:
+    def __init__(self, path: str, min_interval: float = MIN_INTERVAL, max_interval: float = MAX_INTERVAL):
+        self.path = path
+        self.min = min_interval
+        self.max = max_interval
+        self.lock = threading.Lock()
+        self.state: Dict[str, dict] = {}  # key -> {"interval", "due", "mark"}
+        self.dirty = False
+        if os.path.isfile(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.state = json.load(f)
+            except Exception as e:
+                logging.warning(f"pollsched load {path}: {e}")
+
+    def due(self, key: str, now: Optional[float] = None) -> bool:
+        st = self.state.get(key)
+        return st is None or st["due"] <= (now or time.time())
+
+    def overdue(self, key: str, now: float) -> float:
+        """Насколько источник просрочен (новые — самые просроченные)."""
+        st = self.state.get(key)
+        return float("inf") if st is None else now - st["due"]
+
+    def pick(self, keys: Iterable[str], limit: Optional[int] = None) -> List[str]:
+        """Просроченные ключи, самые «голодные» первыми, не больше limit."""
+        now = time.time()
+        with self.lock:
+            ready = [k for k in keys if self.due(k, now)]
+            ready.sort(key=lambda k: self.overdue(k, now), reverse=True)
+        return ready if limit is None else ready[:limit]
+
+    def observe(self, key: str, mark: Union[float, str, None], ok: bool = True):
+        """mark — время самой свежей записи (или её ссылка, если времени в ленте нет)."""
+        now = time.time()
+        with self.lock:
+            st = self.state.setdefault(key, {"interval": START_INTERVAL, "due": now, "mark": None})
+            if ok:
+                prev = st["mark"]
+                if isinstance(mark, (int, float)) and isinstance(prev, (int, float)):
+                    fresh = mark > prev
+                else:
+                    fresh = mark is not None and mark != prev
+                if fresh:
+                    st["interval"] = max(self.min, st["interval"] / 2)
+                    st["mark"] = mark
+                else:
+                    st["interval"] = min(self.max, st["interval"] * BACKOFF)
+            st["due"] = now + st["interval"] * random.uniform(1 - JITTER, 1 + JITTER)
+            self.dirty = True
+
+    def interval(self, key: str) -> float:
+        st = self.state.get(key)
+        return st["interval"] if st else START_INTERVAL
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            data = json.dumps(self.state)
+            self.dirty = False
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            logging.warning(f"pollsched save {self.path}: {e}")
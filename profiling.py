@@ -0,0 +1,169 @@
+"""
+Профилирование одного прохода бота (python main.py profile).
+
+- StackSampler — раз в interval снимает стеки всех потоков (sys._current_frames)
+  и копит их в «свёрнутом» виде: "поток;модуль:функция;…  число" — формат
+  flamegraph.pl, speedscope и inferno. Видно и потоки сбора, и отправителя.
+- ThreadProfiler — cProfile на все потоки: до Python 3.12 — свой профилировщик
+  в каждом новом потоке (threading.setprofile) и слияние в один pstats, с 3.12
+  один профилировщик видит все потоки сам (sys.monitoring).
+- stage_report() — разбивка по стадиям из metrics.stage (stage_seconds):
+  сеть, разбор лент, извлечение из HTML/текста, оценка, дедуп, отправка.
+
+cProfile заметно замедляет код, поэтому он только по запросу (--pstats);
+сэмплер стеков почти ничего не стоит.
+"""
+import os, re, sys, time, pstats, cProfile, threading
+from collections import Counter
+from typing import Dict, List, Optional
+
+import metrics
+
+STAGE_ORDER = ("net", "feedparse", "extract", "score", "dedup", "tg_send")
+STAGE_NAMES = {"net": "сеть (до заголовков ответа)", "feedparse": "разбор лент (feedparser)",
+               "extract": "извлечение HTML/regex", "score": "оценка кандидатов",
+               "dedup": "дедуп (seen/сюжеты)", "tg_send": "отправка в Telegram"}
+
+
+def _thread_label(name: str) -> str:
+    # fetch_3, ThreadPoolExecutor-0_1 → fetch, ThreadPoolExecutor: потоки одного пула — одна ветка графа
+    return re.sub(r"[-_]\d+(_\d+)?$", "", name) or "thread"
+
+
+class StackSampler(threading.Thread):
+    def __init__(self, interval: float = 0.005):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.halt = threading.Event()
+
+    def run(self):
+        me = threading.get_ident()
+        while not self.halt.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                parts = []
+                while frame is not None:
+                    code = frame.f_code
+                    mod = os.path.basename(code.co_filename)
+                    parts.append(f"{mod[:-3] if mod.endswith('.py') else mod}:{code.co_name}")
+                    frame = frame.f_back
+                parts.append(_thread_label(names.get(tid, "thread")))
+                self.stacks[";".join(reversed(parts))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self.halt.set()
+        self.join()
+
+    def dump(self, path: str):
+        """Свёрнутые стеки: flamegraph.pl stacks.folded > flame.svg (или открыть в speedscope)."""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+
+    def hottest(self, top: int = 15, skip_idle: bool = True) -> List[tuple]:
+        """Функции, на которых чаще всего заставали потоки (верх стека): (функция, доля)."""
+        leaf = Counter()
+        for stack, n in self.stacks.items():
+            fn = stack.rsplit(";", 1)[-1]
+            # потоки, ждущие работы или таймера, — не горячий путь
+            if skip_idle and fn in ("threading:wait", "queue:get", "thread:_worker", "selectors:select",
+                                    "socketserver:serve_forever", "scheduler:run_forever"):
+                continue
+            leaf[fn] += n
+        total = sum(leaf.values()) or 1
+        return [(fn, n / total) for fn, n in leaf.most_common(top)]
+
+
+class ThreadProfiler:
+    def __init__(self):
+        self.main = cProfile.Profile()
+        self.profiles: List[cProfile.Profile] = []
+        self.lock = threading.Lock()
+        self.per_thread = sys.version_info < (3, 12)
+
+    def _thread_start(self, frame, event, arg):
+        sys.setprofile(None)
+        p = cProfile.Profile()
+        with self.lock:
+            self.profiles.append(p)
+        p.enable()
+
+    def start(self):
+        if self.per_thread:
+            threading.setprofile(self._thread_start)
+        self.main.enable()
+
+    def stop(self):
+        self.main.disable()
+        if self.per_thread:
+            threading.setprofile(None)
+
+    def stats(self) -> pstats.Stats:
+        st = pstats.Stats(self.main)
+        with self.lock:
+            for p in self.profiles:
+                try:
+                    st.add(p)
+                except (TypeError, ValueError):  # поток так ничего и не вызвал
+                    pass
+        return st
+
+
+class Session:
+    """with Session(pstats_path, stacks_path) as s: ... — сэмплер всегда, cProfile если задан pstats_path."""
+
+    def __init__(self, pstats_path: Optional[str] = None, stacks_path: Optional[str] = None,
+                 interval: float = 0.005):
+        self.pstats_path = pstats_path
+        self.stacks_path = stacks_path
+        self.sampler = StackSampler(interval)
+        self.profiler = ThreadProfiler() if pstats_path else None
+        self.wall = 0.0
+
+    def __enter__(self) -> "Session":
+        self.t0 = time.perf_counter()
+        self.sampler.start()
+        if self.profiler:
+            self.profiler.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.profiler:
+            self.profiler.stop()
+        self.sampler.stop()
+        self.wall = time.perf_counter() - self.t0
+        if self.stacks_path:
+            self.sampler.dump(self.stacks_path)
+        if self.profiler:
+            self.profiler.stats().dump_stats(self.pstats_path)
+
+    def report(self, top: int = 15) -> str:
+        out = [stage_report(self.wall), "", f"Горячие функции (по {self.sampler.samples} снимкам стеков):"]
+        for fn, share in self.sampler.hottest(top):
+            out.append(f"{share * 100:6.1f}%  {fn}")
+        if self.profiler:
+            out += ["", f"cProfile: {self.pstats_path} (python -m pstats {self.pstats_path}; sort cumtime; stats 30)"]
+        if self.stacks_path:
+            out.append(f"Стеки для flame graph: {self.stacks_path} (flamegraph.pl {self.stacks_path} > flame.svg)")
+        return "\n".join(out)
+
+
+def stage_report(wall: float) -> str:
+    totals: Dict[str, tuple] = {dict(k).get("stage", "?"): v for k, v in metrics.REGISTRY.totals("stage_seconds").items()}
+    rate = metrics.STAGE_SAMPLE if metrics.STAGE_SAMPLE < 1 else 1.0
+    out = [f"Проход: {wall:.2f} с по часам; стадии — сумма по всем потокам"
+           + (f" (оценка по {rate:.0%} вызовов)" if rate < 1 else "") + ":",
+           f"{'стадия':32s} {'вызовов':>8s} {'всего, с':>9s} {'сред, мс':>9s} {'от прохода':>10s}"]
+    for name in sorted(totals, key=lambda n: (STAGE_ORDER.index(n) if n in STAGE_ORDER else 99, n)):
+        n, s = totals[name]
+        n, s = n / rate, s / rate
+        out.append(f"{STAGE_NAMES.get(name, name):32s} {n:8.0f} {s:9.2f} {s / n * 1000 if n else 0:9.1f} "
+                   f"{s / wall * 100 if wall else 0:9.0f}%")
+    out.append("Стадии идут параллельно в потоках сбора, поэтому доли в сумме могут быть больше 100%;\n"
+               "«сеть» считает и запросы, сделанные изнутри остальных стадий.")
+    return "\n".join(out)
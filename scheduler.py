@@ -0,0 +1,116 @@
+"""
+Планировщик рубрик на куче: задачи срабатывают в точное время, а не
+«если цикл случайно проснулся в первые две минуты часа».
+
+- daily(): раз в день в HH:MM (можно только по дню недели); отметка
+  «tag:YYYYMMDD» в анти-дублях, как и раньше, — повторно в тот же день не
+  запустится даже после рестарта;
+- при старте пропущенные сегодня задачи догоняются, если с их времени прошло
+  не больше grace секунд;
+- every(): интервальные задачи (публикация новостей);
+- задачи выполняются в небольшом пуле потоков, чтобы долгая рубрика не
+  задерживала соседние.
+"""
+import time, heapq, logging, threading, datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+GRACE = 3 * 3600
+err = logging.getLogger("err")
+
+
+class Job:
+    def __init__(self, name: str, fn: Callable[[], object], at: Optional[Tuple[int, int]] = None,
+                 weekday: Optional[int] = None, interval: float = 0.0, grace: float = GRACE):
+        self.name = name
+        self.fn = fn
+        self.at = at
+        self.weekday = weekday
+        self.interval = interval
+        self.grace = grace
+        self.catchup_for: Optional[float] = None  # запуск «за» пропущенное время
+
+    def next_after(self, t: float) -> float:
+        """Ближайшее срабатывание строго после t (для ежедневных — по местному времени)."""
+        if self.at is None:
+            return t + self.interval
+        d = dt.datetime.fromtimestamp(t)
+        cand = d.replace(hour=self.at[0], minute=self.at[1], second=0, microsecond=0)
+        while cand.timestamp() <= t or (self.weekday is not None and cand.weekday() != self.weekday):
+            cand = (cand + dt.timedelta(days=1)).replace(hour=self.at[0], minute=self.at[1])
+        return cand.timestamp()
+
+    def done_key(self, when: float) -> str:
+        return f"{self.name}:{dt.datetime.fromtimestamp(when).strftime('%Y%m%d')}"
+
+
+class Scheduler:
+    def __init__(self, seen, workers: int = 2):
+        self.seen = seen  # нужны get(key) и mark(key)
+        self.heap: List[Tuple[float, int, Job]] = []
+        self.seq = 0
+        self.stop = threading.Event()
+        self.wake = threading.Event()
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+
+    def _push(self, when: float, job: Job):
+        with self.lock:
+            self.seq += 1
+            heapq.heappush(self.heap, (when, self.seq, job))
+        self.wake.set()
+
+    def daily(self, name: str, hour: int, minute: int, fn, weekday: Optional[int] = None,
+              grace: float = GRACE):
+        job = Job(name, fn, at=(hour, minute), weekday=weekday, grace=grace)
+        t = time.time()
+        # сегодняшнее (или последнее подходящее) срабатывание уже прошло? — догоняем
+        prev = job.next_after(t - 8 * 86400)
+        while job.next_after(prev) <= t:
+            prev = job.next_after(prev)
+        if prev <= t and t - prev <= grace and not self.seen.get(job.done_key(prev)):
+            logging.info(f"{name}: пропущен запуск в {dt.datetime.fromtimestamp(prev):%H:%M}, догоняем")
+            self._push(t, job)
+            job.catchup_for = prev
+        else:
+            self._push(job.next_after(t), job)
+
+    def every(self, name: str, seconds: float, fn, first_in: Optional[float] = None):
+        job = Job(name, fn, interval=seconds)
+        self._push(time.time() + (seconds if first_in is None else first_in), job)
+
+    def _run(self, job: Job, when: float):
+        key = job.done_key(job.catchup_for or when) if job.at else None
+        job.catchup_for = None
+        if key and self.seen.get(key):
+            return
+        ok = False
+        t0 = time.time()
+        try:
+            ok = job.fn()
+        except Exception as e:
+            err.error(f"{job.name}: {e}")
+        if key:
+            self.seen.mark(key)
+            logging.info(f"{job.name}: {'ok' if ok else 'skip'} ({time.time()-t0:.1f} c)")
+
+    def run_forever(self):
+        while not self.stop.is_set():
+            self.wake.clear()
+            with self.lock:
+                when, _, job = self.heap[0] if self.heap else (time.time() + 60, 0, None)
+            delay = when - time.time()
+            if delay > 0:
+                self.wake.wait(min(delay, 60))  # просыпаемся и по новой задаче, и раз в минуту
+                continue
+            with self.lock:
+                heapq.heappop(self.heap)
+            self.pool.submit(self._run, job, when)
+            # интервальные считаем от плана, а не от конца выполнения — без дрейфа
+            nxt = job.next_after(max(when, time.time() - job.interval) if not job.at else when)
+            self._push(nxt, job)
+
+    def shutdown(self):
+        self.stop.set()
+        self.wake.set()
+        self.pool.shutdown(wait=False)
@@ -0,0 +1,89 @@
+"""
+Хранилище анти-дублей на SQLite: ключ → (когда отмечен, когда истекает).
+
+Каждая отметка — отдельная транзакция (WAL), так что файл не бьётся при падении
+посреди записи и не переписывается целиком. Проверка — поиск по первичному
+ключу. Просроченные ключи чистятся не чаще раза в COMPACT_EVERY секунд.
+При первом запуске разово переносит старый .state/seen.json.
+"""
+import os, json, time, sqlite3, logging, threading
+from typing import Optional
+
+COMPACT_EVERY = 3600
+DAY = 86400
+
+
+class SeenStore:
+    def __init__(self, path: str, legacy_json: Optional[str] = None, default_ttl: float = 30 * DAY,
+                 tag_ttl: float = 3 * DAY):
+        self.path = path
+        self.default_ttl = default_ttl
+        self.tag_ttl = tag_ttl
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS seen ("
+                        "key TEXT PRIMARY KEY, ts REAL NOT NULL, expires REAL NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS seen_expires ON seen(expires)")
+        self.last_compact = 0.0
+        if legacy_json and os.path.isfile(legacy_json):
+            self._migrate(legacy_json)
+        self.compact()
+
+    def _ttl_for(self, key: str) -> float:
+        # «tag:YYYYMMDD» — отметки расписания, нужны лишь пару дней
+        return self.tag_ttl if ":" in key else self.default_ttl
+
+    def _migrate(self, legacy_json: str):
+        try:
+            with open(legacy_json, "r", encoding="utf-8") as f:
+                old = json.load(f)
+        except Exception as e:
+            logging.warning(f"seen migrate: не прочитали {legacy_json}: {e}")
+            old = {}
+        rows = []
+        for k, ts in old.items():
+            try:
+                ts = float(ts)
+            except (TypeError, ValueError):
+                ts = time.time()
+            rows.append((k, ts, ts + self._ttl_for(k)))
+        with self.lock:
+            self.db.execute("BEGIN")
+            self.db.executemany("INSERT OR IGNORE INTO seen(key, ts, expires) VALUES (?,?,?)", rows)
+            self.db.execute("COMMIT")
+        os.replace(legacy_json, legacy_json + ".migrated")
+        logging.info(f"seen: перенесено {len(rows)} ключей из {legacy_json}")
+
+    def get(self, key: str) -> Optional[float]:
+        """Время отметки или None, если ключа нет или он истёк."""
+        with self.lock:
+            row = self.db.execute("SELECT ts FROM seen WHERE key=? AND expires>?",
+                                  (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def mark(self, key: str, ttl: Optional[float] = None):
+        now = time.time()
+        ttl = self._ttl_for(key) if ttl is None else ttl
+        try:
+            with self.lock:
+                self.db.execute("INSERT OR REPLACE INTO seen(key, ts, expires) VALUES (?,?,?)",
+                                (key, now, now + ttl))
+        except Exception as e:
+            logging.getLogger("err").error(f"seen mark {key}: {e}")
+        if now - self.last_compact > COMPACT_EVERY:
+            self.compact()
+
+    def compact(self):
+        self.last_compact = time.time()
+        try:
+            with self.lock:
+                n = self.db.execute("DELETE FROM seen WHERE expires<=?", (self.last_compact,)).rowcount
+            if n:
+                logging.info(f"seen: удалено просроченных ключей: {n}")
+        except Exception as e:
+            logging.getLogger("err").error(f"seen compact: {e}")
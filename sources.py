@@ -0,0 +1,117 @@
+"""
+Реестр источников из rss_sources.yaml: обычные ленты (https://…), X-аккаунты
+(x:@handle → Nitter RSS) и Instagram (ig:@user → IG-зеркала).
+
+Реестр разбирается один раз; за проход опрашивается только кусок (shard) каждого
+вида источников — не больше per_cycle штук, поэтому время прохода не растёт
+вместе с длиной списка. Кусок выбирает расписание опроса (pollsched):
+просроченные источники, самые голодные первыми.
+"""
+import os, logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from mirrors import MirrorHealth
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+SOURCES_PATH = os.path.join(BASE, "rss_sources.yaml")
+
+NITTER_MIRRORS = [
+    "https://nitter.net",
+    "https://nitter.poast.org",
+    "https://nitter.fdn.fr",
+    "https://nitter.lacontrevoie.fr",
+]
+os.makedirs(os.path.join(BASE, ".state"), exist_ok=True)
+NITTER_HEALTH = MirrorHealth(os.path.join(BASE, ".state", "nitter_health.json"), NITTER_MIRRORS)
+
+KINDS = ("rss", "x", "ig")
+
+
+def parse_source(s: str) -> Optional[Tuple[str, str]]:
+    """'https://…' → ('rss', url); 'x:@h' → ('x', 'h'); 'ig:@u' → ('ig', 'u')."""
+    s = str(s).strip()
+    if s.startswith(("http://", "https://")):
+        return "rss", s
+    for kind in ("x", "ig"):
+        if s.lower().startswith(kind + ":"):
+            ref = s[len(kind) + 1:].strip().lstrip("@")
+            return (kind, ref) if ref else None
+    return None
+
+
+def load_registry(path: str = SOURCES_PATH) -> Dict[str, List[str]]:
+    """{'rss': [...], 'x': [...], 'ig': [...]} без повторов, в порядке файла."""
+    import yaml  # только когда реестр и правда читают
+    reg: Dict[str, List[str]] = {k: [] for k in KINDS}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = yaml.safe_load(f) or {}
+    except Exception as e:
+        logging.warning(f"sources: не прочитали {path}: {e}")
+        return reg
+    seen = set()
+    for raw in data.get("sources", []) or []:
+        parsed = parse_source(raw)
+        if not parsed:
+            logging.warning(f"sources: непонятный источник {raw!r}")
+            continue
+        key = (parsed[0], parsed[1].lower())
+        if key in seen:
+            continue
+        seen.add(key)
+        reg[parsed[0]].append(parsed[1])
+    return reg
+
+
+def key_for(kind: str, ref: str) -> str:
+    """Ключ источника, не зависящий от зеркала: 'x:variety', 'ig:zendaya' или URL ленты."""
+    return ref if kind == "rss" else f"{kind}:{ref.lower()}"
+
+
+def nitter_url(handle: str) -> Optional[str]:
+    """RSS-адрес X-аккаунта на лучшем живом зеркале (None — все зеркала на паузе)."""
+    base = NITTER_HEALTH.pick(handle)
+    return f"{base}/{handle}/rss" if base else None
+
+
+def feed_urls(path: str = SOURCES_PATH) -> List[str]:
+    """Все адреса лент реестра, которые читаются как RSS (ленты и X через Nitter)."""
+    reg = load_registry(path)
+    urls = list(reg["rss"])
+    for handle in reg["x"]:
+        u = nitter_url(handle)
+        if u:
+            urls.append(u)
+    return urls
+
+
+class Rotation:
+    """Источники одного вида и лимит на проход: сколько из них расписание отдаёт за раз."""
+
+    def __init__(self, items: Iterable[str], per_cycle: int):
+        self.items = list(items)
+        self.per_cycle = max(1, per_cycle)
+
+
+class Registry:
+    """Реестр без «ядра» (его main опрашивает каждый проход) + ротации по видам."""
+
+    def __init__(self, per_cycle: Dict[str, int], core: Dict[str, Iterable[str]] = None,
+                 path: str = SOURCES_PATH):
+        reg = load_registry(path)
+        core = {k: {v.lower() for v in vs} for k, vs in (core or {}).items()}
+        self.rotations = {k: Rotation([v for v in reg[k] if v.lower() not in core.get(k, set())],
+                                      per_cycle.get(k, 1))
+                          for k in KINDS}
+
+    def next_shard(self, schedule) -> Dict[str, List[str]]:
+        """Кусок на этот проход: по виду — до per_cycle источников, которые пора опросить."""
+        out = {}
+        for k, r in self.rotations.items():
+            by_key = {key_for(k, v): v for v in r.items}
+            out[k] = [by_key[key] for key in schedule.pick(by_key, limit=r.per_cycle)]
+        return out
+
+    def describe(self) -> str:
+        return ", ".join(f"{k}={len(r.items)} (до {r.per_cycle} за проход, по расписанию)"
+                         for k, r in self.rotations.items())
@@ -1,8 +1,12 @@
 """
-Тренды дня: читаем несколько RSS-лент (Reddit / кино), выбираем 3–5 самых горячих тем и публикуем короткий дайджест.
+Тренды дня: сюжеты последних суток, о которых пишут сразу несколько источников
+(локальный архив сборщика бота); если таких мало — несколько RSS-лент Reddit.
+Выбираем 3–5 самых горячих тем и публикуем короткий дайджест.
 """
-import time, logging, feedparser, os
-from common import send_telegram, build_caption, gpt_summarize
+import time, logging, os
+from common import send_telegram, build_caption, gpt_summarize, drain_outbox
+from feedcache import fetch_feed
+import archive
 
 TREND_SOURCES = [
     "https://www.reddit.com/r/movies/.rss",
@@ -12,11 +16,20 @@ TREND_SOURCES = [
 
 MAX_ITEMS = int(os.getenv("TRENDS_MAX_ITEMS", "12"))
 TOP_N = int(os.getenv("TRENDS_TOP_N", "5"))
+TRENDS_HOURS = int(os.getenv("TRENDS_HOURS", "24"))
 
 def collect_trends():
+    rows = archive.default().top(time.time() - TRENDS_HOURS * 3600, limit=MAX_ITEMS,
+                                 min_sources=2, by_sources=True)
+    if len(rows) >= TOP_N:
+        return [f"- {r['title']}" for r in rows]
+    return collect_trends_from_feeds()
+
+def collect_trends_from_feeds():
     items = []
     for src in TREND_SOURCES:
-        feed = feedparser.parse(src)
+        feed, _ = fetch_feed(src)
+        if not feed: continue
         for e in feed.entries[:MAX_ITEMS//len(TREND_SOURCES)+1]:
             title = getattr(e, "title", "")
             link = getattr(e, "link", "")
@@ -47,3 +60,4 @@ def main():
 
 if __name__ == "__main__":
     main()
+    raise SystemExit(0 if drain_outbox() else 1)
@@ -1,23 +1,35 @@
 """
-Еженедельный дайджест: собираем лучшие заголовки недели из RSS-ссылок (rss_sources.yaml),
-делаем краткий обзор и публикуем один пост.
+Еженедельный дайджест: берём лучшие сюжеты недели из локального архива сборщика
+бота (archive.py), делаем краткий обзор и публикуем один пост. Если архив пуст
+(бот не работал), по старинке читаем RSS-ленты из rss_sources.yaml.
 """
-import time, yaml, feedparser, logging
+import time, logging
 from datetime import datetime, timedelta
-from common import send_telegram, build_caption, gpt_summarize
+from common import send_telegram, build_caption, gpt_summarize, drain_outbox
+from feedcache import fetch_feed
+import archive
+import sources
 
 LOOKBACK_DAYS = 7
+MIN_ARCHIVE = 10  # меньше сюжетов в архиве — значит, бот неделю не собирал
 
 def load_sources():
-    with open("rss_sources.yaml", "r", encoding="utf-8") as f:
-        data = yaml.safe_load(f) or {}
-    return data.get("sources", [])
+    # ленты как есть, x:@… — через Nitter; ig:@… в RSS не превращаются
+    return sources.feed_urls()
 
 def collect_titles():
     since = time.time() - LOOKBACK_DAYS * 86400
+    rows = archive.default().top(since, limit=100)  # по сюжету, лучшие по оценке
+    if len(rows) >= MIN_ARCHIVE:
+        return [r["title"] for r in rows]
+    logging.info(f"В архиве {len(rows)} сюжетов за неделю — читаем ленты")
+    return collect_titles_from_feeds(since)
+
+def collect_titles_from_feeds(since):
     titles = []
     for src in load_sources():
-        feed = feedparser.parse(src)
+        feed, _ = fetch_feed(src)
+        if not feed: continue
         for e in feed.entries:
             ts = None
             if getattr(e, "published_parsed", None):
@@ -47,3 +59,4 @@ def main():
 
 if __name__ == "__main__":
     main()
+    raise SystemExit(0 if drain_outbox() else 1)